@@ -0,0 +1,116 @@
+"""
+RSS per recorded contract while recording.
+
+    python -m benchmarks.recording_memory [count]
+"""
+import json
+import multiprocessing
+import os
+import resource
+import sys
+
+from contractest.common.body import Body
+from contractest.common.contract import Contract
+from contractest.common.header import Headers
+from contractest.common.record import ContractRecord, RecordingStore
+from contractest.common.store import ContractStore
+
+REQUEST_HEADERS = {
+    "host": "localhost:3000",
+    "user-agent": "benchmark",
+    "accept": "application/json",
+    "content-type": "application/json",
+    "cookie": "session=abc; theme=dark",
+}
+RESPONSE_HEADERS = {
+    "content-type": "application/json",
+    "content-length": "2048",
+    "set-cookie": "session=abc; Path=/",
+}
+
+
+def rss() -> int:
+    """
+    Current RSS in bytes, the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def exchange(i: int):
+    request_body = json.dumps({"id": i, "name": f"user {i}"}).encode("utf-8")
+    response_body = json.dumps(
+        {
+            "id": i,
+            "items": [{"id": j, "value": f"item {i} {j}"} for j in range(30)],
+        }
+    ).encode("utf-8")
+    return f"/users/{i}", request_body, response_body
+
+
+def record_contracts(count: int) -> ContractStore:
+    store = ContractStore()
+    for i in range(count):
+        path, request_body, response_body = exchange(i)
+        store.add(
+            Contract(
+                path=path,
+                method="post",
+                request_headers=Headers.from_dict(REQUEST_HEADERS),
+                request_body=Body(request_body.decode("utf-8"), path),
+                response_headers=Headers.from_dict(RESPONSE_HEADERS),
+                response_body=Body(response_body.decode("utf-8"), path),
+                response_status_code=200,
+            )
+        )
+    return store
+
+
+def record_records(count: int, memory_limit: int = 0) -> RecordingStore:
+    store = RecordingStore(memory_limit=memory_limit)
+    for i in range(count):
+        path, request_body, response_body = exchange(i)
+        store.add(
+            ContractRecord(
+                method="post",
+                path=path,
+                status_code=200,
+                request_headers=REQUEST_HEADERS,
+                request_body=request_body,
+                response_headers=RESPONSE_HEADERS,
+                response_body=response_body,
+            )
+        )
+    return store
+
+
+def measure(name, func, count, queue, *args):
+    before = rss()
+    store = func(count, *args)  # kept alive until measured
+    queue.put((name, (rss() - before) / count))
+    del store
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = [
+        ("Contract (ContractStore)", record_contracts),
+        ("ContractRecord", record_records),
+        ("ContractRecord, 8 MB limit", record_records, 8 * 1024 * 1024),
+    ]
+
+    print(f"Recording {count} contracts")
+    for name, func, *args in cases:
+        # a process per case, so the RSS of a case does not affect the others
+        queue: multiprocessing.Queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=measure, args=(name, func, count, queue, *args)
+        )
+        process.start()
+        result = queue.get()
+        process.join()
+        print(f"{result[0]:<30} {result[1]:>10.0f} bytes RSS per contract")
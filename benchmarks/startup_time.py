@@ -0,0 +1,53 @@
+"""
+Startup time of the test service until the contracts are loaded,
+cold (contract files parsed) and warm (loaded from the store cache).
+
+    python -m benchmarks.startup_time [count]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.recording_memory import record_records
+
+# what `python -m contractest.test_service` does before the first request
+LOAD_STORE = """
+from contractest.config import Config, TestServiceConfig
+from contractest.test_service.runner import load_store
+
+load_store(Config(test_service=TestServiceConfig(
+    load_from_folder={folder!r}, store_cache_dir={cache_dir!r}
+)))
+"""
+
+
+def run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "contracts")
+        cache_dir = os.path.join(tmp, "stores")
+        record_records(count).write(folder)
+
+        cases = [
+            ("interpreter", "pass"),
+            ("import test_service", "import contractest.test_service.__main__"),
+            ("load, no cache", LOAD_STORE.format(folder=folder, cache_dir="")),
+            # the first run writes the cache, the second one reads it
+            ("load, cold cache", LOAD_STORE.format(folder=folder, cache_dir=cache_dir)),
+            ("load, warm cache", LOAD_STORE.format(folder=folder, cache_dir=cache_dir)),
+        ]
+
+        print(f"Loading {count} contracts")
+        for name, code in cases:
+            print(f"{name:<30} {run(code) * 1000:>10.0f} ms")
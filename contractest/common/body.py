@@ -1,31 +1,81 @@
+import copy
 import json
+import math
+from functools import lru_cache
 from typing import List, Optional
+from xml.etree.ElementTree import ParseError
 
-import xmltodict
 from termcolor import colored
 
 from contractest.common.discrepancy import Discrepancy, DiscrepancyTypes
-from contractest.config import config
+from contractest.common.xml_compare import compare_xml
+from contractest.config import BodyComparisonConfig
+
+default_comparison_config = BodyComparisonConfig()
+
+# first offending indices reported for arrays of numbers
+MAX_REPORTED_INDICES = 5
 
 
 class Body:
-    def __init__(self, body: str, api_path: str):
+    def __init__(self, body: str, api_path: str, content_type: Optional[str] = None):
         self.body = body
-        self.content_type = self.determine_content_type()
-        self.dict = self.parse_body()
+        self.content_type = self.determine_content_type(content_type)
+        self._dict: Optional[dict] = None  # parsed on first use
         self.api_path = api_path
 
-    def determine_content_type(self) -> str:
+    @property
+    def dict(self) -> dict:
+        if self._dict is None:
+            self._dict = self.parse_body()
+        return self._dict
+
+    @dict.setter
+    def dict(self, d: dict):
+        self._dict = d
+
+    def determine_content_type(self, content_type: Optional[str] = None) -> str:
+        """
+        Use the content type header if there is one, anything but json or xml
+        is compared as text. Without the header guess from the body.
+        """
         if isinstance(self.body, (dict, list)):  # this happens usually on empty body
             return "application/json"
+        if content_type:
+            if "json" in content_type:
+                return "application/json"
+            if "xml" in content_type:
+                return "application/xml"
+            return "text/plain"
         if self.body.startswith("{") or self.body.startswith("["):
             return "application/json"
         if self.body.startswith("<"):
             return "application/xml"
         return "text/plain"
 
+    @property
+    def is_raw_xml(self) -> bool:
+        return (
+            self.content_type == "application/xml"
+            and isinstance(self.body, str)
+            and self.body != ""
+        )
+
+    @property
+    def is_text(self) -> bool:
+        return self.content_type == "text/plain" and self.body != ""
+
+    def to_value(self):
+        """
+        The body as saved in a contract, the raw text for text bodies
+        and the raw document for XML so it can be compared while parsing.
+        """
+        if self.is_raw_xml or self.is_text:
+            return self.body
+        return self.dict
+
     def parse_body(self):
-        if self.body == "":
+        if self.body == "" or self.content_type == "text/plain":
             return {}
 
         body = self.body
@@ -34,6 +84,8 @@ class Body:
                 body = json.loads(self.body)
         if self.content_type == "application/xml":
             if isinstance(body, str):
+                import xmltodict
+
                 body = xmltodict.parse(self.body)
 
         # order by keys alphabetically
@@ -45,12 +97,54 @@ class Body:
 
         return k
 
-    def compare(self, expected_body: "Body") -> List[Discrepancy]:
-        discrepancies = find_mismatch_of_dicts(
-            expected_body.dict, self.dict, self.api_path, discrepancies=[]
-        )
+    def with_dict(self, d: dict) -> "Body":
+        """
+        Shallow copy of the body with an already parsed dict, nothing is re-parsed.
+        Raw XML is sent as the document, so it is serialized from the dict.
+        """
+        body = copy.copy(self)
+        if self.is_raw_xml:
+            import xmltodict
+
+            body.body = xmltodict.unparse(
+                d, full_document=self.body.lstrip().startswith("<?xml")
+            )
+        body.dict = d
+        return body
+
+    def compare(
+        self,
+        expected_body: "Body",
+        comparison_config: Optional[BodyComparisonConfig] = None,
+    ) -> List[Discrepancy]:
+        comparison_config = comparison_config or default_comparison_config
+        if self.is_text or expected_body.is_text:
+            discrepancies = compare_text(expected_body, self)
+        elif self.is_raw_xml and expected_body.is_raw_xml:
+            try:
+                discrepancies = compare_xml(
+                    expected_body.body, self.body, self.api_path, comparison_config
+                )
+            except ParseError as e:
+                discrepancies = [
+                    Discrepancy(
+                        msg="invalid XML",
+                        discrepancy_type=DiscrepancyTypes.TYPE_MISMATCH,
+                        path="",
+                        expected_value="a well-formed document",
+                        actual_value=str(e),
+                    )
+                ]
+        else:
+            discrepancies = find_mismatch_of_dicts(
+                expected_body.dict,
+                self.dict,
+                self.api_path,
+                discrepancies=[],
+                comparison_config=comparison_config,
+            )
 
-        if config.body_comparison.strict_match:
+        if comparison_config.strict_match:
             return discrepancies
 
         value_discrepancies = [
@@ -58,7 +152,7 @@ class Body:
             for d in discrepancies
             if d.discrepancy_type == DiscrepancyTypes.VALUE_MISMATCH
         ]
-        if config.body_comparison.value_match and value_discrepancies:
+        if comparison_config.value_match and value_discrepancies:
             return value_discrepancies
 
         structural_discrepancies = [
@@ -67,7 +161,7 @@ class Body:
             if d.discrepancy_type == DiscrepancyTypes.KEY_MISMATCH
             or d.discrepancy_type == DiscrepancyTypes.TYPE_MISMATCH
         ]
-        if config.body_comparison.structure_match and structural_discrepancies:
+        if comparison_config.structure_match and structural_discrepancies:
             return structural_discrepancies
 
         order_discrepancies = [
@@ -76,34 +170,55 @@ class Body:
             if d.discrepancy_type == DiscrepancyTypes.LENGTH_MISMATCH
             or d.discrepancy_type == DiscrepancyTypes.ORDER_MISMATCH
         ]
-        if config.body_comparison.array_order_match and order_discrepancies:
+        if comparison_config.array_order_match and order_discrepancies:
             return order_discrepancies
 
         return discrepancies
 
 
+def compare_text(expected_body: Body, actual_body: Body) -> List[Discrepancy]:
+    """
+    Bodies that are neither json nor xml are compared as they are.
+    """
+    if expected_body.content_type != actual_body.content_type:
+        return [
+            Discrepancy(
+                msg="content type mismatch",
+                discrepancy_type=DiscrepancyTypes.TYPE_MISMATCH,
+                path="",
+                expected_value=expected_body.content_type,
+                actual_value=actual_body.content_type,
+            )
+        ]
+    if expected_body.body != actual_body.body:
+        return [
+            Discrepancy(
+                msg="value mismatch",
+                discrepancy_type=DiscrepancyTypes.VALUE_MISMATCH,
+                path="",
+                expected_value=expected_body.body,
+                actual_value=actual_body.body,
+            )
+        ]
+    return []
+
+
 def find_mismatch_of_dicts(
     expected_dict,
     actual_dict,
     api_path,
     nested_key="",
     discrepancies: List[Discrepancy] = [],
+    comparison_config: BodyComparisonConfig = default_comparison_config,
 ) -> List[Discrepancy]:
     """
     Find if two dicts are structurally same
     and their values are same.
     Dicts can be nested in multiple levels.
     """
-    exp_keys = sorted(expected_dict.keys())
-    actual_keys = sorted(actual_dict.keys())
-    # TODO implement ignore fields/keys
-    for ig in (
-        config.body_comparison.ignore_fields or []
-    ) + config.body_comparison.ignore_fields_by_path.get(api_path, []):
-        if ig in exp_keys:
-            exp_keys.remove(ig)
-        if ig in actual_keys:
-            actual_keys.remove(ig)
+    ignored_fields = comparison_config.ignored_fields(api_path)
+    exp_keys = sorted(k for k in expected_dict.keys() if k not in ignored_fields)
+    actual_keys = sorted(k for k in actual_dict.keys() if k not in ignored_fields)
 
     for exp_key, actual_key in zip(exp_keys, actual_keys):
         if exp_key != actual_key:
@@ -124,15 +239,19 @@ def find_mismatch_of_dicts(
             find_mismatch_of_dicts(
                 expected_dict[key],
                 actual_dict[key],
-                f"{nested_key}.{key}" if nested_key else key,
-                discrepancies,
+                api_path,
+                nested_key=f"{nested_key}.{key}" if nested_key else key,
+                discrepancies=discrepancies,
+                comparison_config=comparison_config,
             )
         elif isinstance(actual_dict[key], list):
             find_mismatch_of_lists(
                 expected_dict[key],
                 actual_dict[key],
-                f"{nested_key}.{key}" if nested_key else key,
-                discrepancies,
+                api_path,
+                nested_key=f"{nested_key}.{key}" if nested_key else key,
+                discrepancies=discrepancies,
+                comparison_config=comparison_config,
             )
         else:
             # compare types
@@ -162,8 +281,15 @@ def find_mismatch_of_dicts(
     return discrepancies
 
 
-def find_mismatch_of_lists(expected_list, actual_list, nested_key="", discrepancies=[]):
-    if config.body_comparison.array_length_match:
+def find_mismatch_of_lists(
+    expected_list,
+    actual_list,
+    api_path,
+    nested_key="",
+    discrepancies=[],
+    comparison_config: BodyComparisonConfig = default_comparison_config,
+):
+    if comparison_config.array_length_match:
         if len(expected_list) != len(actual_list):
             discrepancies.append(
                 Discrepancy(
@@ -176,23 +302,35 @@ def find_mismatch_of_lists(expected_list, actual_list, nested_key="", discrepanc
             )
             return
 
+    if is_numeric_list(expected_list) and is_numeric_list(actual_list):
+        discrepancy = find_mismatch_of_numbers(
+            expected_list, actual_list, nested_key, comparison_config
+        )
+        if discrepancy is not None:
+            discrepancies.append(discrepancy)
+        return
+
     small_list = min(len(expected_list or []), len(actual_list or []))
 
-    if config.body_comparison.array_order_match:
+    if comparison_config.array_order_match:
         for i in range(small_list):
             if isinstance(actual_list[i], dict):
                 find_mismatch_of_dicts(
                     expected_list[i],
                     actual_list[i],
-                    f"{nested_key}[{i}]",
-                    discrepancies,
+                    api_path,
+                    nested_key=f"{nested_key}[{i}]",
+                    discrepancies=discrepancies,
+                    comparison_config=comparison_config,
                 )
             elif isinstance(actual_list[i], list):
                 find_mismatch_of_lists(
                     expected_list[i],
                     actual_list[i],
-                    f"{nested_key}[{i}]",
-                    discrepancies,
+                    api_path,
+                    nested_key=f"{nested_key}[{i}]",
+                    discrepancies=discrepancies,
+                    comparison_config=comparison_config,
                 )
             else:
                 if expected_list[i] != actual_list[i]:
@@ -211,15 +349,19 @@ def find_mismatch_of_lists(expected_list, actual_list, nested_key="", discrepanc
                 find_mismatch_of_dicts(
                     expected_list[i],
                     actual_list[i],
-                    f"{nested_key}[{i}]",
-                    discrepancies,
+                    api_path,
+                    nested_key=f"{nested_key}[{i}]",
+                    discrepancies=discrepancies,
+                    comparison_config=comparison_config,
                 )
             elif isinstance(actual_list[i], list):
                 find_mismatch_of_lists(
                     expected_list[i],
                     actual_list[i],
-                    f"{nested_key}[{i}]",
-                    discrepancies,
+                    api_path,
+                    nested_key=f"{nested_key}[{i}]",
+                    discrepancies=discrepancies,
+                    comparison_config=comparison_config,
                 )
             else:
                 if expected_list[i] in actual_list:
@@ -234,6 +376,120 @@ def find_mismatch_of_lists(expected_list, actual_list, nested_key="", discrepanc
                     )
 
 
+@lru_cache(maxsize=None)
+def _numpy():
+    """
+    numpy is optional and slow to import, it is imported on the first array of numbers.
+    """
+    try:
+        import numpy
+
+        return numpy
+    except ImportError:
+        return None
+
+
+def is_numeric_list(values: list) -> bool:
+    return all(type(v) is int or type(v) is float for v in values)
+
+
+def is_float_list(values: list) -> bool:
+    return all(type(v) is float for v in values)
+
+
+def numbers_mismatch(
+    expected: float, actual: float, abs_tolerance: float, rel_tolerance: float
+) -> bool:
+    """
+    Integers are compared exactly, they may be too large for a float (like ids),
+    floats within the tolerances like math.isclose. NaN never matches.
+    """
+    if (type(expected) is int and type(actual) is int) or not (
+        abs_tolerance or rel_tolerance
+    ):
+        return expected != actual
+    return not math.isclose(
+        expected, actual, rel_tol=rel_tolerance, abs_tol=abs_tolerance
+    )
+
+
+def find_mismatch_of_numbers(
+    expected_list: list,
+    actual_list: list,
+    nested_key: str,
+    comparison_config: BodyComparisonConfig,
+) -> Optional[Discrepancy]:
+    """
+    Compare arrays of numbers in one pass (with numpy for floats if available)
+    within the tolerances of the field, see `numbers_mismatch`.
+    All mismatches are summarized in one discrepancy.
+    Without array order match the sorted arrays are compared.
+    """
+    abs_tolerance, rel_tolerance = comparison_config.numeric_tolerance(nested_key)
+    n = min(len(expected_list), len(actual_list))
+    expected_list = expected_list[:n]
+    actual_list = actual_list[:n]
+    if not comparison_config.array_order_match:
+        expected_list = sorted(expected_list)
+        actual_list = sorted(actual_list)
+
+    np = _numpy()
+    # only floats, numpy would turn large integers into inexact floats
+    if np is not None and is_float_list(expected_list) and is_float_list(actual_list):
+        expected = np.asarray(expected_list, dtype=float)
+        actual = np.asarray(actual_list, dtype=float)
+        with np.errstate(invalid="ignore"):  # NaN and infinities
+            deviations = np.abs(actual - expected)
+            allowed = np.maximum(
+                rel_tolerance * np.maximum(np.abs(actual), np.abs(expected)),
+                abs_tolerance,
+            )
+        # same as numbers_mismatch: equal infinities match, NaN never does,
+        # and an infinity is not within a relative tolerance of anything else
+        offending = np.flatnonzero(
+            (actual != expected)
+            & (
+                ~np.isfinite(actual)
+                | ~np.isfinite(expected)
+                | ~(deviations <= allowed)
+            )
+        )
+        count = len(offending)
+        offending_deviations = deviations[offending].tolist()
+        indices = offending[:MAX_REPORTED_INDICES].tolist()
+    else:
+        offending_indices = [
+            i
+            for i, (e, a) in enumerate(zip(expected_list, actual_list))
+            if numbers_mismatch(e, a, abs_tolerance, rel_tolerance)
+        ]
+        count = len(offending_indices)
+        offending_deviations = [
+            abs(actual_list[i] - expected_list[i]) for i in offending_indices
+        ]
+        indices = offending_indices[:MAX_REPORTED_INDICES]
+
+    if not count:
+        return None
+    # NaN deviations are left out, unless there is nothing else
+    max_deviation = max(
+        (d for d in offending_deviations if not math.isnan(d)), default=math.nan
+    )
+
+    return Discrepancy(
+        msg=(
+            f"{count} of {n} numbers mismatch, max deviation {max_deviation}, "
+            f"first at indices {indices}"
+        ),
+        discrepancy_type=DiscrepancyTypes.ORDER_MISMATCH
+        if comparison_config.array_order_match
+        else DiscrepancyTypes.VALUE_MISMATCH,
+        path=nested_key,
+        expected_value=[expected_list[i] for i in indices],
+        actual_value=[actual_list[i] for i in indices],
+    )
+
+
 def print_dict_str(
     d: dict, discrepancies: List[Discrepancy], pad=0, nested_key="", print_str=""
 ) -> str:
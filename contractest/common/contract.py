@@ -1,12 +1,14 @@
 import hashlib
 import json
-from dataclasses import dataclass
-from typing import Any, List
-
-import requests
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, List, Optional
 
 from contractest.common.body import Body
 from contractest.common.header import Headers
+from contractest.common.json_path import JsonPath, compile_json_path
+
+if TYPE_CHECKING:
+    import requests
 
 
 @dataclass
@@ -30,12 +32,34 @@ class Contract:
             "path": self.path,
             "method": self.method,
             "request_headers": self.request_headers.to_dict(),
-            "request_body": self.request_body.dict,
+            "request_body": self.request_body.to_value(),
             "response_headers": self.response_headers.to_dict(),
-            "response_body": self.response_body.dict,
+            "response_body": self.response_body.to_value(),
             "response_status_code": self.response_status_code,
         }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "Contract":
+        request_headers = Headers.from_dict(data["request_headers"])
+        response_headers = Headers.from_dict(data["response_headers"])
+        return cls(
+            path=data["path"],
+            method=data["method"],
+            request_headers=request_headers,
+            request_body=Body(
+                data["request_body"],
+                data["path"],
+                request_headers.get("content-type"),
+            ),
+            response_headers=response_headers,
+            response_body=Body(
+                data["response_body"],
+                data["path"],
+                response_headers.get("content-type"),
+            ),
+            response_status_code=data["response_status_code"],
+        )
+
 
 class ParameterPosition:
     HEADER = "header"
@@ -52,12 +76,14 @@ class ContractFlowStoreModel:
     parameter_name: str  # can be json path for nested objects
 
     _value: Any = None
+    _json_path: JsonPath = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._json_path = compile_json_path(self.parameter_name)
 
     def parse_param_value_from_contract(self, contract: Contract) -> Any:
         if self.parameter_position == ParameterPosition.BODY:
-            return self._parse_json_path(
-                contract.response_body.dict, self.parameter_name
-            )
+            return self._json_path.get(contract.response_body.dict)
         elif self.parameter_position == ParameterPosition.HEADER:
             return contract.response_headers.get(self.parameter_name)
         elif self.parameter_position == ParameterPosition.COOKIES:
@@ -68,9 +94,16 @@ class ContractFlowStoreModel:
                 "only header, cookies and body are supported in 'store'"
             )
 
-    def parse_param_value_from_response(self, response: requests.Response) -> Any:
+    def parse_param_value_from_response(
+        self, response: "requests.Response", response_body: Optional[Body] = None
+    ) -> Any:
+        """
+        Pass the already parsed `response_body` to avoid parsing the response again.
+        """
         if self.parameter_position == ParameterPosition.BODY:
-            return self._parse_json_path(response.json(), self.parameter_name)
+            if response_body is not None:
+                return self._json_path.get(response_body.dict)
+            return self._json_path.get(response.json())
         elif self.parameter_position == ParameterPosition.HEADER:
             return response.headers.get(self.parameter_name)
         elif self.parameter_position == ParameterPosition.COOKIES:
@@ -81,14 +114,6 @@ class ContractFlowStoreModel:
                 "only header, cookies and body are supported in 'store'"
             )
 
-    def _parse_json_path(self, data: dict, path: str) -> Any:
-        for key in path.split("."):
-            if key.isdigit():
-                data = data[int(key)]
-            else:
-                data = data[key]
-        return data
-
     def to_dict(self) -> dict:
         return {
             "key": self.key,
@@ -103,14 +128,27 @@ class ContractFlowUseValue:
     parameter_position: ParameterPosition
     parameter_name: str  # can be json path for nested objects
 
+    _json_path: JsonPath = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._json_path = compile_json_path(self.parameter_name)
+
     def set_param_value_in_contract(self, contract: Contract, value: Any):
+        """
+        Set the value in the request part of the contract.
+        The request parts are copied before modification (copy-on-write),
+        so the given contract should be a shallow copy of the loaded one.
+        """
         if self.parameter_position == ParameterPosition.BODY:
-            data = contract.request_body.dict
-            self._set_json_path(data, self.parameter_name, value)
-            contract.request_body = Body(json.dumps(data), contract.path)
+            request_body = contract.request_body
+            contract.request_body = request_body.with_dict(
+                self._json_path.replace(request_body.dict, value)
+            )
         elif self.parameter_position == ParameterPosition.HEADER:
+            contract.request_headers = contract.request_headers.copy()
             contract.request_headers.set(self.parameter_name, str(value))
         elif self.parameter_position == ParameterPosition.COOKIES:
+            contract.request_headers = contract.request_headers.copy()
             contract.request_headers.set_cookie(self.parameter_name, str(value))
         elif self.parameter_position == ParameterPosition.PATH:
             contract.path = contract.path.replace(self.parameter_name, str(value))
@@ -126,11 +164,6 @@ class ContractFlowUseValue:
                 "Invalid parameter_position, only header and body are supported in 'use'"
             )
 
-    def _set_json_path(self, data: dict, path: str, value: Any):
-        for key in path.split(".")[:-1]:
-            data = data[key]
-        data[path.split(".")[-1]] = value
-
     def to_dict(self) -> dict:
         return {
             "key": self.key,
@@ -146,6 +179,7 @@ class ContractFlow:
     store: List[ContractFlowStoreModel]
     use: List[ContractFlowUseValue]
     contract_hash: str
+    timestamp: float = 0.0  # when the contract was recorded
 
     def to_dict(self) -> dict:
         return {
@@ -154,6 +188,7 @@ class ContractFlow:
             "store": [s.to_dict() for s in self.store],
             "use": [u.to_dict() for u in self.use],
             "contract_hash": self.contract_hash,
+            "timestamp": self.timestamp,
         }
 
     @classmethod
@@ -178,4 +213,5 @@ class ContractFlow:
                 for u in data["use"]
             ],
             contract_hash=data["contract_hash"],
+            timestamp=data.get("timestamp", 0.0),
         )
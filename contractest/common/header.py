@@ -1,28 +1,71 @@
-from dataclasses import dataclass
-from typing import List, Union
-
-from requests.structures import CaseInsensitiveDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Tuple, Union
 
 from contractest.common.discrepancy import Discrepancy, DiscrepancyTypes
-from contractest.config import config
+from contractest.config import HeaderComparisonConfig
+
+if TYPE_CHECKING:
+    from requests.structures import CaseInsensitiveDict
+
+default_comparison_config = HeaderComparisonConfig()
 
 cookies_headers = [
     "set-cookie",
     "cookie",
 ]
 
+# the attributes in set-cookie are parsed like cookies, their names are not
+# case-sensitive (RFC 6265 5.2) unlike the names of cookies
+cookie_attributes = frozenset(
+    ["expires", "max-age", "domain", "path", "secure", "httponly", "samesite"]
+)
+
+# headers of a single connection, not forwarded by a proxy (RFC 9110 7.6.1)
+hop_by_hop_headers = frozenset(
+    [
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    ]
+)
+
+
+@dataclass
+class HeadersView:
+    """
+    Normalized view of headers for comparison,
+    lowercased header names with cookies parsed and ignore rules applied.
+    """
+
+    headers: Dict[str, str]
+    cookies: Dict[str, str]
+
 
 @dataclass
 class Headers:
     val: dict
 
+    # normalized views by ignore rules, reset whenever the headers are modified
+    _views: Dict[Tuple[FrozenSet[str], FrozenSet[str]], HeadersView] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
     @classmethod
-    def from_dict(cls, headers: Union[CaseInsensitiveDict, dict]):
+    def from_dict(cls, headers: Union["CaseInsensitiveDict", dict]):
         return cls({k.lower(): v for k, v in headers.items()})
 
     def to_dict(self):
         return self.val
 
+    def copy(self) -> "Headers":
+        return Headers(self.val.copy())
+
     def has(self, header: str) -> bool:
         return header in self.val
 
@@ -31,16 +74,16 @@ class Headers:
 
     def set(self, header: str, value: str):
         self.val[header] = value
+        self._views.clear()
 
-    def cookies(self) -> dict:
+    def cookies(self, ignored_cookies: FrozenSet[str] = frozenset()) -> dict:
         cookies = {}
         for cookie_header in cookies_headers:
             if cookie_header in self.val:
                 cookies.update(self._parse_cookie(self.val[cookie_header]))
 
-        for ic in config.headers_comparison.ignore_cookies:
-            if ic in cookies:
-                cookies.pop(ic)
+        if ignored_cookies:
+            return {k: v for k, v in cookies.items() if k not in ignored_cookies}
         return cookies
 
     def _parse_cookie(self, cookie_header: str) -> dict:
@@ -58,50 +101,120 @@ class Headers:
         for cookie_header in cookies_headers:
             if cookie_header in self.val:
                 self.val[cookie_header] = self._cookies_dict_to_str(cookies)
+        self._views.clear()
 
     def _cookies_dict_to_str(self, cookies: dict) -> str:
         return "; ".join([f"{k}={v}" for k, v in cookies.items()])
 
-    def headers_without_cookies(self) -> dict:
-        headers = self.val.copy()
-        for cookie_header in cookies_headers:
-            if cookie_header in headers:
-                headers.pop(cookie_header)
-
-        for ih in config.headers_comparison.ignore_headers:
-            if ih in headers:
-                headers.pop(ih)
-        return headers
-
-    def compare(self, expected_headers: "Headers") -> List[Discrepancy]:
-        discrepancies = []
-
-        self_cookies = self.cookies()
-        expected_cookies = expected_headers.cookies()
-        for self_cookie, exp_cookie in zip(self_cookies, expected_cookies):
-            if self_cookie != exp_cookie:
-                discrepancies.append(
-                    Discrepancy(
-                        f"Cookie {self_cookie} is not equal to {exp_cookie}",
-                        DiscrepancyTypes.VALUE_MISMATCH,
-                        "header",
-                        exp_cookie,
-                        self_cookie,
-                    )
-                )
+    def without_hop_by_hop(self) -> "Headers":
+        """
+        Copy without the hop-by-hop headers, including the ones named in `connection`.
+        """
+        connection_headers = {
+            h.strip().lower() for h in self.get("connection").split(",") if h.strip()
+        }
+        return Headers(
+            {
+                k: v
+                for k, v in self.val.items()
+                if k not in hop_by_hop_headers and k not in connection_headers
+            }
+        )
+
+    def view(
+        self,
+        ignored_headers: FrozenSet[str] = frozenset(),
+        ignored_cookies: FrozenSet[str] = frozenset(),
+    ) -> HeadersView:
+        """
+        Get the normalized view, it is computed once per ignore rules.
+        """
+        key = (ignored_headers, ignored_cookies)
+        view = self._views.get(key)
+        if view is None:
+            headers = {}
+            cookies = {}
+            for k, v in self.val.items():
+                k = k.lower()
+                if k in cookies_headers:
+                    for ck, cv in self._parse_cookie(v).items():
+                        if ck.lower() in cookie_attributes:
+                            ck = ck.lower()
+                        if ck not in ignored_cookies:
+                            cookies[ck] = cv
+                elif k not in ignored_headers:
+                    headers[k] = v
+            view = self._views[key] = HeadersView(headers, cookies)
+        return view
+
+    def compare(
+        self,
+        expected_headers: "Headers",
+        comparison_config: Optional[HeaderComparisonConfig] = None,
+    ) -> List[Discrepancy]:
+        comparison_config = comparison_config or default_comparison_config
+        ignore_rules = (
+            comparison_config.ignored_headers,
+            comparison_config.ignored_cookies,
+        )
+        self_view = self.view(*ignore_rules)
+        expected_view = expected_headers.view(*ignore_rules)
+
+        discrepancies = find_mismatch_of_named_values(
+            expected_view.cookies,
+            self_view.cookies,
+            "cookie",
+            comparison_config.value_match,
+        )
+        discrepancies += find_mismatch_of_named_values(
+            expected_view.headers,
+            self_view.headers,
+            "header",
+            comparison_config.value_match,
+        )
+        return discrepancies
 
-        self_headers = self.headers_without_cookies()
-        exp_headers = expected_headers.headers_without_cookies()
-        for self_header, expected_header in zip(self_headers, exp_headers):
-            if self_header != expected_header:
-                discrepancies.append(
-                    Discrepancy(
-                        f"Header {self_header} is not equal to {expected_header}",
-                        DiscrepancyTypes.VALUE_MISMATCH,
-                        "header",
-                        expected_header,
-                        self_header,
-                    )
+
+def find_mismatch_of_named_values(
+    expected: Dict[str, str], actual: Dict[str, str], kind: str, value_match=True
+) -> List[Discrepancy]:
+    """
+    Find missing, extra and changed names (headers or cookies)
+    with dict lookups, so it is linear in the number of names.
+    """
+    discrepancies = []
+    for name, expected_value in expected.items():
+        if name not in actual:
+            discrepancies.append(
+                Discrepancy(
+                    f"{kind.capitalize()} {name} is missing",
+                    DiscrepancyTypes.KEY_MISMATCH,
+                    f"{kind}.{name}",
+                    name,
+                    None,
+                )
+            )
+        elif value_match and actual[name] != expected_value:
+            discrepancies.append(
+                Discrepancy(
+                    f"{kind.capitalize()} {name} value mismatch",
+                    DiscrepancyTypes.VALUE_MISMATCH,
+                    f"{kind}.{name}",
+                    expected_value,
+                    actual[name],
                 )
+            )
+
+    for name in actual:
+        if name not in expected:
+            discrepancies.append(
+                Discrepancy(
+                    f"{kind.capitalize()} {name} is not expected",
+                    DiscrepancyTypes.KEY_MISMATCH,
+                    f"{kind}.{name}",
+                    None,
+                    name,
+                )
+            )
 
-        return discrepancies
+    return discrepancies
@@ -0,0 +1,96 @@
+import re
+from functools import lru_cache
+from typing import Any, List, Tuple, Union
+
+WILDCARD = "*"
+
+_index_pattern = re.compile(r"\[(\d+|\*)\]")
+
+Token = Union[str, int]
+
+
+def _key(data: Any, token: Token) -> Token:
+    # a digit token indexes a list, in an object it is a key like any other
+    if isinstance(token, int) and not isinstance(data, list):
+        return str(token)
+    return token
+
+
+class JsonPath:
+    """
+    A dotted json path compiled once into a tuple of tokens.
+    Supports nested keys (`a.b`), array indexes (`a.0` or `a[0]`)
+    and wildcards (`a.*.b` or `a[*].b`).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tokens: Tuple[Token, ...] = self._compile(path)
+        self.has_wildcard = WILDCARD in self.tokens
+
+    @staticmethod
+    def _compile(path: str) -> Tuple[Token, ...]:
+        tokens: List[Token] = []
+        for part in _index_pattern.sub(r".\1", path).split("."):
+            if part == "":
+                continue
+            if part.isdigit():
+                tokens.append(int(part))
+            else:
+                tokens.append(part)
+        return tuple(tokens)
+
+    def get(self, data: Any) -> Any:
+        """
+        Get the value at the path. If the path has wildcards,
+        a list of all matched values is returned.
+        """
+        if not self.has_wildcard:
+            for token in self.tokens:
+                data = data[_key(data, token)]
+            return data
+        return list(self._iter_matches(data, self.tokens))
+
+    def replace(self, data: Any, value: Any) -> Any:
+        """
+        Copy-on-write set, returns a new root with the value set.
+        If the path has wildcards, all matched positions are set.
+        Only the containers along the path are copied, the rest is shared with `data`.
+        """
+        return self._replace(data, self.tokens, value)
+
+    def _replace(self, data: Any, tokens: Tuple[Token, ...], value: Any) -> Any:
+        if not tokens:
+            return value
+
+        token, rest = tokens[0], tokens[1:]
+        new_data = list(data) if isinstance(data, list) else dict(data)
+        if token == WILDCARD:
+            keys = range(len(data)) if isinstance(data, list) else list(data)
+        else:
+            keys = [_key(data, token)]
+        for key in keys:
+            # the last key may not exist yet, it is added then
+            new_data[key] = self._replace(data[key], rest, value) if rest else value
+        return new_data
+
+    def _iter_matches(self, data: Any, tokens: Tuple[Token, ...]):
+        if not tokens:
+            yield data
+            return
+
+        token, rest = tokens[0], tokens[1:]
+        if token == WILDCARD:
+            children = data if isinstance(data, list) else data.values()
+            for child in children:
+                yield from self._iter_matches(child, rest)
+        else:
+            yield from self._iter_matches(data[_key(data, token)], rest)
+
+    def __repr__(self):
+        return f"JsonPath({self.path!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_json_path(path: str) -> JsonPath:
+    return JsonPath(path)
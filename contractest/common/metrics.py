@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+
+class Stages:
+    UPSTREAM = "upstream"
+    BODY_PARSING = "body_parsing"
+    HASHING = "hashing"
+    STORE_APPEND = "store_append"
+    COMPARISON = "comparison"
+    REPORTING = "reporting"
+
+
+@dataclass
+class StageTiming:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+class Metrics:
+    """
+    Time spent per stage and counters, safe to use from multiple threads.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageTiming] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            timing = self.stages.get(stage)
+            if timing is None:
+                timing = self.stages[stage] = StageTiming()
+            timing.count += 1
+            timing.total += seconds
+            timing.max = max(timing.max, seconds)
+
+    def merge(self, stages: Dict[str, StageTiming]):
+        """
+        Add the stage timings of another run, for example of another process.
+        """
+        with self._lock:
+            for stage, other in stages.items():
+                timing = self.stages.get(stage)
+                if timing is None:
+                    timing = self.stages[stage] = StageTiming()
+                timing.count += other.count
+                timing.total += other.total
+                timing.max = max(timing.max, other.max)
+
+    def inc(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_prometheus(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Metrics in the Prometheus text format,
+        with `labels` added to every sample (like the worker of the process).
+        """
+        extra = "".join(f',{k}="{v}"' for k, v in (labels or {}).items())
+        counter_labels = f"{{{extra[1:]}}}" if extra else ""
+        with self._lock:
+            lines = [
+                "# HELP contractest_stage_seconds Time spent per stage.",
+                "# TYPE contractest_stage_seconds summary",
+            ]
+            for stage, timing in sorted(self.stages.items()):
+                lines.append(
+                    f'contractest_stage_seconds_sum{{stage="{stage}"{extra}}} '
+                    f"{timing.total}"
+                )
+                lines.append(
+                    f'contractest_stage_seconds_count{{stage="{stage}"{extra}}} '
+                    f"{timing.count}"
+                )
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE contractest_{counter}_total counter")
+                lines.append(f"contractest_{counter}_total{counter_labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """
+        Printable summary of the stages, the slowest first.
+        """
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda s: s[1].total, reverse=True)
+            lines = [
+                f"{'stage':<16}{'count':>8}{'total s':>12}{'avg ms':>10}{'max ms':>10}"
+            ]
+            for stage, t in stages:
+                lines.append(
+                    f"{stage:<16}{t.count:>8}{t.total:>12.3f}"
+                    f"{t.total / t.count * 1000:>10.2f}{t.max * 1000:>10.2f}"
+                )
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_run(
+    profile_file: Optional[str] = None, trace_memory: bool = False
+) -> Iterator[None]:
+    """
+    Opt-in profiling of a run.
+    The cProfile stats are dumped to `profile_file` (read with `pstats`),
+    the top memory allocations to `profile_file.memory.txt` (or printed).
+    """
+    if not profile_file and not trace_memory:
+        yield
+        return
+
+    # imported only when profiling
+    import cProfile
+    import tracemalloc
+
+    profiler = cProfile.Profile() if profile_file else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            print(f"Profile written to {profile_file}")
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            top = "\n".join(str(s) for s in snapshot.statistics("lineno")[:25])
+            if profile_file:
+                with open(f"{profile_file}.memory.txt", "w") as f:
+                    f.write(top)
+                print(f"Memory allocations written to {profile_file}.memory.txt")
+            else:
+                print(top)
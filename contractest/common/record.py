@@ -0,0 +1,236 @@
+import gzip
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from typing import IO, Iterator, List, Optional, Set
+
+from contractest.common.body import Body
+from contractest.common.contract import Contract, ContractFlow
+from contractest.common.header import Headers
+from contractest.common.metrics import Metrics, Stages
+
+try:
+    import brotli
+except ImportError:  # br encoded bodies can not be decoded without it
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+
+def decode_content(body: bytes, content_encoding: str) -> bytes:
+    """
+    Decode a body by its content-encoding header,
+    the encodings are undone in the reverse order they were applied.
+    """
+    encodings = [e.strip().lower() for e in content_encoding.split(",") if e.strip()]
+    for encoding in reversed(encodings):
+        if encoding in ("gzip", "x-gzip"):
+            body = gzip.decompress(body)
+        elif encoding == "deflate":
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                # some servers send raw deflate without the zlib wrapper
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+        elif encoding == "br":
+            if brotli is None:
+                raise ValueError("brotli is required to decode br encoded bodies")
+            body = brotli.decompress(body)
+        elif encoding != "identity":
+            raise ValueError(f"Unsupported content-encoding {encoding}")
+    return body
+
+
+class ContractRecord:
+    """
+    Compact recorded exchange, the raw bytes of the request and response
+    in one buffer with the offsets of each part.
+    The response body is kept as sent by the upstream (maybe compressed).
+    Nothing is decoded or parsed until the record is turned into a Contract.
+    """
+
+    __slots__ = (
+        "method",
+        "path",
+        "status_code",
+        "timestamp",
+        "data",
+        "request_body_start",
+        "response_headers_start",
+        "response_body_start",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        status_code: int,
+        request_headers: dict,
+        request_body: bytes,
+        response_headers: dict,
+        response_body: bytes,
+        timestamp: Optional[float] = None,
+    ):
+        self.method = method
+        self.path = path
+        self.status_code = status_code
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+        request_headers_bytes = json.dumps(request_headers).encode("utf-8")
+        response_headers_bytes = json.dumps(response_headers).encode("utf-8")
+        self.request_body_start = len(request_headers_bytes)
+        self.response_headers_start = self.request_body_start + len(request_body)
+        self.response_body_start = self.response_headers_start + len(
+            response_headers_bytes
+        )
+        self.data = b"".join(
+            [request_headers_bytes, request_body, response_headers_bytes, response_body]
+        )
+
+    def __getstate__(self):
+        return tuple(getattr(self, s) for s in self.__slots__)
+
+    def __setstate__(self, state):
+        for s, value in zip(self.__slots__, state):
+            setattr(self, s, value)
+
+    @property
+    def request_headers(self) -> bytes:
+        return self.data[: self.request_body_start]
+
+    @property
+    def request_body(self) -> bytes:
+        return self.data[self.request_body_start : self.response_headers_start]
+
+    @property
+    def response_headers(self) -> bytes:
+        return self.data[self.response_headers_start : self.response_body_start]
+
+    @property
+    def response_body(self) -> bytes:
+        return self.data[self.response_body_start :]
+
+    def to_contract(self) -> Contract:
+        request_headers = Headers.from_dict(json.loads(self.request_headers))
+        response_headers = Headers.from_dict(json.loads(self.response_headers))
+        return Contract(
+            path=self.path,
+            method=self.method,
+            request_headers=request_headers,
+            request_body=Body(
+                self.request_body.decode("utf-8"),
+                self.path,
+                request_headers.get("content-type"),
+            ),
+            response_headers=response_headers,
+            response_body=Body(
+                decode_content(
+                    self.response_body, response_headers.get("content-encoding")
+                ).decode("utf-8"),
+                self.path,
+                response_headers.get("content-type"),
+            ),
+            response_status_code=self.status_code,
+        )
+
+
+class RecordingStore:
+    """
+    Store of the proxy while recording.
+    Records are kept in memory up to `memory_limit` bytes,
+    the older records are spilled to a temporary file on disk after that.
+    Written in the same format as ContractStore.
+    """
+
+    def __init__(self, memory_limit: int = 0):
+        self.memory_limit = memory_limit  # bytes, 0 means no limit
+        self.records: List[ContractRecord] = []
+        self.memory_size = 0
+        self.spilled = 0
+        self._spill_file: Optional[IO[bytes]] = None
+
+    def add(self, record: ContractRecord):
+        self.records.append(record)
+        self.memory_size += len(record.data)
+        if self.memory_limit and self.memory_size > self.memory_limit:
+            self._spill()
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.records)
+
+    def _spill(self):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="contractest-")
+        self._spill_file.seek(0, 2)
+        for record in self.records:
+            pickle.dump(record, self._spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled += len(self.records)
+        log.debug(f"Spilled {len(self.records)} records to disk")
+        self.records = []
+        self.memory_size = 0
+
+    def __iter__(self) -> Iterator[ContractRecord]:
+        """
+        Iterate the records in the recorded order, the spilled ones first.
+        """
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            for _ in range(self.spilled):
+                yield pickle.load(self._spill_file)
+        yield from self.records
+
+    def write(self, path: str = "contracts", metrics: Optional[Metrics] = None):
+        """
+        Write the records as contracts.json and flow.yaml,
+        one record is turned into a contract at a time.
+        """
+        import yaml
+
+        flow_file = path + "/flow.yaml"
+        contracts_file = path + "/contracts.json"
+        os.makedirs(path, exist_ok=True)
+
+        metrics = metrics or Metrics()
+        flow = []
+        written: Set[str] = set()
+        with open(contracts_file, "w") as f:
+            f.write("{")
+            for record in self:
+                try:
+                    with metrics.time(Stages.BODY_PARSING):
+                        contract = record.to_contract()
+                        contract_dict = contract.to_dict()
+                    with metrics.time(Stages.HASHING):
+                        contract_hash = contract.hash()
+                except Exception as e:
+                    log.error(f"Skipped {record.method.upper()} {record.path}: {e}")
+                    continue
+                if contract_hash not in written:
+                    f.write(", " if written else "")
+                    f.write(f"{json.dumps(contract_hash)}: ")
+                    f.write(json.dumps(contract_dict))
+                    written.add(contract_hash)
+
+                flow.append(
+                    ContractFlow(
+                        path=contract.path,
+                        method=contract.method,
+                        store=[],
+                        use=[],
+                        contract_hash=contract_hash,
+                        timestamp=record.timestamp,
+                    ).to_dict()
+                )
+            f.write("}")
+
+        with open(flow_file, "w") as f:
+            f.write(yaml.dump(flow))
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
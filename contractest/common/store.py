@@ -1,11 +1,17 @@
+import hashlib
 import json
-from typing import Dict, List
+import logging
+import os
+import pickle
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-import yaml
-
-from contractest.common.body import Body
 from contractest.common.contract import Contract, ContractFlow
-from contractest.common.header import Headers
+
+log = logging.getLogger(__name__)
+
+# bump when the pickled classes change, older caches are ignored
+STORE_CACHE_VERSION = 1
 
 
 class ContractStore:
@@ -13,15 +19,17 @@ class ContractStore:
         self.contracts: Dict[str, Contract] = {}
         self.flow: List[ContractFlow] = []
 
-    def add(self, contract: Contract):
-        self.contracts[contract.hash()] = contract
+    def add(self, contract: Contract, timestamp: Optional[float] = None):
+        contract_hash = contract.hash()
+        self.contracts[contract_hash] = contract
         self.flow.append(
             ContractFlow(
                 path=contract.path,
                 method=contract.method,
                 store=[],
                 use=[],
-                contract_hash=contract.hash(),
+                contract_hash=contract_hash,
+                timestamp=time.time() if timestamp is None else timestamp,
             )
         )
 
@@ -32,11 +40,14 @@ class ContractStore:
         return list(self.contracts.values())
 
     def write(self, path: str = "contracts"):
+        import yaml
+
         flow_file = path + "/flow.yaml"
         contracts_file = path + "/contracts.json"
+        os.makedirs(path, exist_ok=True)
 
         with open(flow_file, "w") as f:
-            f.write(yaml.dump(f.to_dict() for f in self.flow))
+            f.write(yaml.dump([flow.to_dict() for flow in self.flow]))
 
         with open(contracts_file, "w") as f:
             f.write(
@@ -45,7 +56,34 @@ class ContractStore:
                 )
             )
 
-    def load(self, path: str = "contracts"):
+    def load(
+        self,
+        path: str = "contracts",
+        verbose: bool = True,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        Load the contracts and the flow from `path`.
+        With `cache_dir` the loaded store is pickled there, and loaded from it
+        while contracts.json and flow.yaml are not modified, nothing is parsed then.
+        """
+        if cache_dir:
+            cache_file, cache_key = _store_cache(path, cache_dir)
+            cached = _read_store_cache(cache_file, cache_key)
+            if cached is not None:
+                self.contracts, self.flow = cached
+                if verbose:
+                    print(f"Loaded {len(self.contracts)} contracts from {cache_file}")
+                return
+
+        self._load(path, verbose)
+
+        if cache_dir:
+            _write_store_cache(cache_file, cache_key, (self.contracts, self.flow))
+
+    def _load(self, path: str, verbose: bool):
+        import yaml
+
         flow_file = path + "/flow.yaml"
         contracts_file = path + "/contracts.json"
 
@@ -53,26 +91,146 @@ class ContractStore:
             contracts = json.loads(f.read())
 
         for hash, contract in contracts.items():
-            c = Contract(
-                path=contract["path"],
-                method=contract["method"],
-                request_headers=Headers.from_dict(contract["request_headers"]),
-                request_body=Body(
-                    contract["request_body"],
-                    contract["path"],
-                ),
-                response_headers=Headers.from_dict(contract["response_headers"]),
-                response_body=Body(
-                    contract["response_body"],
-                    contract["path"],
-                ),
-                response_status_code=contract["response_status_code"],
-            )
+            c = Contract.from_dict(contract)
             self.add(c)
-            print(f"Loaded contract: {c.method.upper()} {c.path} : {c.hash()}")
+            if verbose:
+                print(f"Loaded contract: {c.method.upper()} {c.path} : {c.hash()}")
 
+        # the C loader is much faster, if PyYAML is built with libyaml
+        loader = getattr(yaml, "CFullLoader", yaml.FullLoader)
         with open(flow_file, "r") as f:
-            flow = yaml.load(f.read(), Loader=yaml.FullLoader)
+            flow = yaml.load(f.read(), Loader=loader)
 
         # replace the flow with the loaded flow
         self.flow = [ContractFlow.from_dict(f) for f in flow]
+
+
+def merge_folders(paths: List[str], path: str):
+    """
+    Merge contract folders into one written to `path` without loading them,
+    the contracts are copied one at a time, once per hash.
+    The flow is ordered by timestamp, ties are broken by the position
+    of the folder and the flow, so the result is the same for the same folders.
+    """
+    import yaml
+
+    loader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+    flows = []
+    for i, folder in enumerate(paths):
+        with open(folder + "/flow.yaml", "r") as f:
+            flow = yaml.load(f.read(), Loader=loader) or []
+        flows.extend(((f.get("timestamp", 0.0), i, n), f) for n, f in enumerate(flow))
+    flows.sort(key=lambda x: x[0])
+
+    os.makedirs(path, exist_ok=True)
+    written: Set[str] = set()
+    with open(path + "/contracts.json", "w") as f:
+        f.write("{")
+        for folder in paths:
+            for contract_hash, contract in iter_contracts(folder + "/contracts.json"):
+                if contract_hash in written:
+                    continue
+                f.write(", " if written else "")
+                f.write(f"{json.dumps(contract_hash)}: {json.dumps(contract)}")
+                written.add(contract_hash)
+        f.write("}")
+
+    with open(path + "/flow.yaml", "w") as f:
+        f.write(yaml.dump([flow for _, flow in flows]))
+
+
+def _store_cache(path: str, cache_dir: str) -> Tuple[str, tuple]:
+    """
+    The cache file of a contracts folder and the key it must match,
+    the mtime and size of the source files.
+    """
+    path = os.path.abspath(path)
+    key: tuple = (STORE_CACHE_VERSION,)
+    for name in ("contracts.json", "flow.yaml"):
+        stat = os.stat(os.path.join(path, name))
+        key += (stat.st_mtime_ns, stat.st_size)
+    name = hashlib.md5(path.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{name}.pickle"), key
+
+
+def _read_store_cache(cache_file: str, cache_key: tuple):
+    try:
+        with open(cache_file, "rb") as f:
+            key, store = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f"Ignored unreadable store cache {cache_file}: {e}")
+        return None
+    return store if key == cache_key else None
+
+
+def _write_store_cache(cache_file: str, cache_key: tuple, store: tuple):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # written aside and renamed, so a concurrent load never reads half a file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump((cache_key, store), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        log.warning(f"Could not write store cache {cache_file}: {e}")
+
+
+def iter_contracts(
+    contracts_file: str, chunk_size: int = 1 << 20
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Stream (hash, contract dict) from a contracts.json file
+    without loading the whole file, one contract is decoded at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(contracts_file, "r") as f:
+        buf = ""
+        pos = 0
+
+        def next_char() -> str:
+            # skip whitespace, reading more if needed
+            nonlocal buf, pos
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                buf, pos = f.read(chunk_size), 0
+                if not buf:
+                    raise ValueError(f"Unexpected end of {contracts_file}")
+
+        def decode():
+            nonlocal buf, pos
+            while True:
+                try:
+                    value, pos = decoder.raw_decode(buf, pos)
+                    return value
+                except json.JSONDecodeError:
+                    more = f.read(chunk_size)
+                    if not more:
+                        raise
+                    buf, pos = buf[pos:] + more, 0
+
+        if next_char() != "{":
+            raise ValueError(f"{contracts_file} is not a json object")
+        pos += 1
+
+        while True:
+            char = next_char()
+            if char == "}":
+                return
+            if char == ",":
+                pos += 1
+                next_char()
+
+            contract_hash = decode()
+            if next_char() != ":":
+                raise ValueError(f"Invalid json in {contracts_file}")
+            pos += 1
+            next_char()
+            yield contract_hash, decode()
+
+            # drop what is already decoded
+            buf, pos = buf[pos:], 0
@@ -0,0 +1,249 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element, XMLPullParser
+
+from contractest.common.discrepancy import Discrepancy, DiscrepancyTypes
+from contractest.config import BodyComparisonConfig
+
+XmlSource = Union[str, bytes, Iterable[bytes]]
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _iter_chunks(source: XmlSource, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, bytes):
+        for i in range(0, len(source), chunk_size):
+            yield source[i : i + chunk_size]
+    else:
+        yield from source
+
+
+def iter_xml_events(
+    source: XmlSource, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[str, Element]]:
+    """
+    Incrementally parse the document and yield ("start"|"end"|"tail", element).
+    The "tail" event of an element follows its "end" event once the text after it
+    (`element.tail`) is complete, that is at the next event of the document.
+    Finished elements are cleared and detached from their parent after that,
+    so only the open elements are kept in memory.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    open_elements: List[Element] = []
+    ended: Optional[Element] = None  # its tail may not be complete yet
+
+    def release_ended() -> Iterator[Tuple[str, Element]]:
+        nonlocal ended
+        if ended is None:
+            return
+        element, ended = ended, None
+        yield "tail", element
+        element.clear()
+        if open_elements:
+            open_elements[-1].remove(element)
+
+    def events() -> Iterator[Tuple[str, Element]]:
+        nonlocal ended
+        for event, element in parser.read_events():
+            # the tree builder sets the tail before the next event
+            yield from release_ended()
+            if event == "start":
+                open_elements.append(element)
+                yield event, element
+            else:
+                yield event, element
+                open_elements.pop()
+                ended = element
+
+    for chunk in _iter_chunks(source, chunk_size):
+        parser.feed(chunk)
+        yield from events()
+    parser.close()
+    yield from events()
+    yield from release_ended()
+
+
+class _XmlPath:
+    """
+    Path of the current element like `root.items.item[2].name`.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self._counts: List[Dict[str, int]] = [{}]
+
+    def push(self, tag: str):
+        n = self._counts[-1].get(tag, 0)
+        self._counts[-1][tag] = n + 1
+        self.parts.append(f"{tag}[{n}]" if n else tag)
+        self._counts.append({})
+
+    def pop(self) -> str:
+        self._counts.pop()
+        return self.parts.pop()
+
+    def __str__(self):
+        return ".".join(self.parts)
+
+
+def _skip_element(events: Iterator[Tuple[str, Element]]) -> bool:
+    """
+    Consume the events of an element after its start, False if the document ends.
+    """
+    depth = 1
+    for event, _ in events:
+        if event == "start":
+            depth += 1
+        elif event == "end":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+def compare_xml(
+    expected: XmlSource,
+    actual: XmlSource,
+    api_path: str,
+    comparison_config: BodyComparisonConfig,
+    chunk_size: int = CHUNK_SIZE,
+) -> List[Discrepancy]:
+    """
+    Compare two XML documents element by element while parsing them,
+    without building either document in memory.
+    Tags, attributes, texts and the texts after elements (mixed content)
+    are compared, ignored fields are skipped.
+    The comparison stops at the first structural mismatch,
+    as the rest of the documents can not be aligned after that.
+    """
+    ignored_fields = comparison_config.ignored_fields(api_path)
+    expected_events = iter_xml_events(expected, chunk_size)
+    actual_events = iter_xml_events(actual, chunk_size)
+    path = _XmlPath()
+    closed = ""  # the last closed element, for the path of its tail
+    discrepancies: List[Discrepancy] = []
+
+    while True:
+        expected_event = next(expected_events, None)
+        actual_event = next(actual_events, None)
+        if expected_event is None and actual_event is None:
+            return discrepancies
+
+        mismatch = _structure_mismatch(expected_event, actual_event, str(path))
+        if mismatch is not None:
+            discrepancies.append(mismatch)
+            return discrepancies
+
+        event, expected_element = expected_event  # type: ignore
+        _, actual_element = actual_event  # type: ignore
+        tag = expected_element.tag
+
+        if event == "start":
+            path.push(tag)
+            if tag in ignored_fields:
+                if not (
+                    _skip_element(expected_events) and _skip_element(actual_events)
+                ):
+                    return discrepancies
+                closed = path.pop()
+                continue
+            discrepancies.extend(
+                _compare_attributes(expected_element, actual_element, str(path))
+            )
+        elif event == "end":
+            discrepancies.extend(
+                _compare_text(expected_element.text, actual_element.text, str(path))
+            )
+            closed = path.pop()
+        else:
+            tail_path = ".".join(path.parts + [f"{closed}#tail"])
+            discrepancies.extend(
+                _compare_text(expected_element.tail, actual_element.tail, tail_path)
+            )
+
+
+def _compare_text(
+    expected: Optional[str], actual: Optional[str], path: str
+) -> List[Discrepancy]:
+    expected_text = (expected or "").strip()
+    actual_text = (actual or "").strip()
+    if expected_text == actual_text:
+        return []
+    return [
+        Discrepancy(
+            msg="value mismatch",
+            discrepancy_type=DiscrepancyTypes.VALUE_MISMATCH,
+            path=path,
+            expected_value=expected_text,
+            actual_value=actual_text,
+        )
+    ]
+
+
+def _structure_mismatch(
+    expected_event: Optional[Tuple[str, Element]],
+    actual_event: Optional[Tuple[str, Element]],
+    path: str,
+) -> Optional[Discrepancy]:
+    if expected_event is not None and actual_event is not None:
+        if expected_event[0] == actual_event[0]:
+            if expected_event[1].tag == actual_event[1].tag:
+                return None
+
+    def describe(event: Optional[Tuple[str, Element]]) -> Optional[str]:
+        if event is None:
+            return None
+        kind, element = event
+        if kind == "start":
+            return element.tag
+        return f"end of {element.tag}" if kind == "end" else f"text after {element.tag}"
+
+    return Discrepancy(
+        msg="elements mismatch",
+        discrepancy_type=DiscrepancyTypes.KEY_MISMATCH,
+        path=path,
+        expected_value=describe(expected_event),
+        actual_value=describe(actual_event),
+    )
+
+
+def _compare_attributes(
+    expected_element: Element, actual_element: Element, path: str
+) -> List[Discrepancy]:
+    discrepancies = []
+    expected_attrib = expected_element.attrib
+    actual_attrib = actual_element.attrib
+    for name, value in expected_attrib.items():
+        if name not in actual_attrib:
+            discrepancies.append(
+                Discrepancy(
+                    msg="keys mismatch",
+                    discrepancy_type=DiscrepancyTypes.KEY_MISMATCH,
+                    path=f"{path}.@{name}",
+                    expected_value=name,
+                    actual_value=None,
+                )
+            )
+        elif actual_attrib[name] != value:
+            discrepancies.append(
+                Discrepancy(
+                    msg="value mismatch",
+                    discrepancy_type=DiscrepancyTypes.VALUE_MISMATCH,
+                    path=f"{path}.@{name}",
+                    expected_value=value,
+                    actual_value=actual_attrib[name],
+                )
+            )
+    for name in actual_attrib:
+        if name not in expected_attrib:
+            discrepancies.append(
+                Discrepancy(
+                    msg="keys mismatch",
+                    discrepancy_type=DiscrepancyTypes.KEY_MISMATCH,
+                    path=f"{path}.@{name}",
+                    expected_value=None,
+                    actual_value=name,
+                )
+            )
+    return discrepancies
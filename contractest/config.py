@@ -1,21 +1,53 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 import toml
 
 
+@dataclass
+class RouteConfig:
+    name: str
+    server_base_url: str
+    path_prefix: str = ""
+    host: Optional[str] = None
+    cache_ttl: Optional[float] = None  # seconds, the proxy `cache_ttl` if not set
+
+
 @dataclass
 class ProxyConfig:
     host: str = "localhost"
     port: int = 8000
     server_base_url: str = "http://localhost:7777"
     save_to_folder: str = "./contracts"
+    reload_on_sighup: bool = False
+    workers: int = 1
+    memory_limit_mb: int = 0
+    metrics: bool = False
+    cache: bool = False
+    cache_max_entries: int = 1024
+    cache_ttl: float = 60.0
+    cache_methods: List[str] = field(default_factory=lambda: ["get"])
+    cache_key_headers: List[str] = field(
+        default_factory=lambda: ["accept", "authorization", "cookie"]
+    )
+    verify_from_folder: str = ""
+    verify_queue_size: int = 10000
+    routes: List[RouteConfig] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.routes = [
+            r if isinstance(r, RouteConfig) else RouteConfig(**r) for r in self.routes
+        ]
+        self.cache_methods = [m.lower() for m in self.cache_methods]
+        self.cache_key_headers = [h.lower() for h in self.cache_key_headers]
 
 
 @dataclass
 class TestServiceConfig:
     load_from_folder: str = "./contracts"
     server_base_url: str = "http://localhost:7777"
+    last_run_file: str = "./.contractest_cache/last_run.json"
+    store_cache_dir: str = "./.contractest_cache/stores"
 
 
 @dataclass
@@ -27,33 +59,96 @@ class BodyComparisonConfig:
     array_order_match: bool = True
     ignore_fields: Optional[List[str]] = None
     ignore_fields_by_path: Optional[Dict[str, List[str]]] = None
+    numeric_abs_tolerance: float = 0.0
+    numeric_rel_tolerance: float = 0.0
+    # field name or nested path (like `data.values`) to {"abs": .., "rel": ..}
+    numeric_tolerance_by_path: Optional[Dict[str, Dict[str, float]]] = None
+
+    # precomputed lookups, the lists above are only read once
+    _ignore_fields: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _ignore_fields_by_path: Dict[str, FrozenSet[str]] = field(
+        init=False, repr=False, compare=False
+    )
+    _numeric_tolerance: Tuple[float, float] = field(
+        init=False, repr=False, compare=False
+    )
+    _numeric_tolerance_by_path: Dict[str, Tuple[float, float]] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self._ignore_fields = frozenset(self.ignore_fields or [])
+        self._ignore_fields_by_path = {
+            path: self._ignore_fields.union(fields)
+            for path, fields in (self.ignore_fields_by_path or {}).items()
+        }
+        self._numeric_tolerance = (
+            self.numeric_abs_tolerance,
+            self.numeric_rel_tolerance,
+        )
+        self._numeric_tolerance_by_path = {
+            path: (
+                tolerance.get("abs", self.numeric_abs_tolerance),
+                tolerance.get("rel", self.numeric_rel_tolerance),
+            )
+            for path, tolerance in (self.numeric_tolerance_by_path or {}).items()
+        }
+
+    def ignored_fields(self, api_path: str) -> FrozenSet[str]:
+        return self._ignore_fields_by_path.get(api_path, self._ignore_fields)
+
+    def numeric_tolerance(self, nested_key: str) -> Tuple[float, float]:
+        """
+        (absolute, relative) tolerance of a numeric field,
+        by the nested path first and then by the field name.
+        """
+        tolerance = self._numeric_tolerance_by_path.get(nested_key)
+        if tolerance is None:
+            field_name = nested_key.rsplit(".", 1)[-1].split("[", 1)[0]
+            tolerance = self._numeric_tolerance_by_path.get(
+                field_name, self._numeric_tolerance
+            )
+        return tolerance
 
 
 @dataclass
 class HeaderComparisonConfig:
     ignore_headers: Optional[List[str]] = None
     ignore_cookies: Optional[List[str]] = None
+    value_match: bool = True
+
+    ignored_headers: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    ignored_cookies: FrozenSet[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.ignored_headers = frozenset(h.lower() for h in self.ignore_headers or [])
+        # cookie names are case-sensitive
+        self.ignored_cookies = frozenset(self.ignore_cookies or [])
 
 
 @dataclass
 class Config:
-    proxy: ProxyConfig
-    test_service: TestServiceConfig
-    body_comparison: BodyComparisonConfig
-    headers_comparison: HeaderComparisonConfig
+    proxy: ProxyConfig = field(default_factory=ProxyConfig)
+    test_service: TestServiceConfig = field(default_factory=TestServiceConfig)
+    body_comparison: BodyComparisonConfig = field(default_factory=BodyComparisonConfig)
+    headers_comparison: HeaderComparisonConfig = field(
+        default_factory=HeaderComparisonConfig
+    )
 
 
-def load_config(config_file):
+def load_config(config_file: str = "conf.toml") -> Config:
     """
     Load configurations from a file.
     """
     with open(config_file) as f:
         config = toml.load(f)
 
-    proxy_config = ProxyConfig(**config["proxy"])
-    test_service_config = TestServiceConfig(**config["test_service"])
-    body_comparison_config = BodyComparisonConfig(**config["body_comparison"])
-    header_comparison_config = HeaderComparisonConfig(**config["headers_comparison"])
+    proxy_config = ProxyConfig(**config.get("proxy", {}))
+    test_service_config = TestServiceConfig(**config.get("test_service", {}))
+    body_comparison_config = BodyComparisonConfig(**config.get("body_comparison", {}))
+    header_comparison_config = HeaderComparisonConfig(
+        **config.get("headers_comparison", {})
+    )
 
     return Config(
         proxy=proxy_config,
@@ -61,6 +156,3 @@ def load_config(config_file):
         body_comparison=body_comparison_config,
         headers_comparison=header_comparison_config,
     )
-
-
-config = load_config("conf.toml")
@@ -0,0 +1,25 @@
+import argparse
+
+from contractest.config import load_config
+from contractest.diff.diff import diff_stores, print_diff
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m contractest.diff")
+    parser.add_argument("old", help="folder of the old contracts")
+    parser.add_argument("new", help="folder of the new contracts")
+    parser.add_argument("--config", default="conf.toml", help="config file")
+    parser.add_argument(
+        "--processes", type=int, help="compare the contracts in this many processes"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = load_config(args.config)
+
+    diffs = diff_stores(args.old, args.new, config, args.processes)
+    print_diff(diffs)
+    if diffs:
+        exit(1)
@@ -0,0 +1,150 @@
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from termcolor import cprint
+
+from contractest.common.contract import Contract
+from contractest.common.store import iter_contracts
+from contractest.config import Config
+
+Route = Tuple[str, str]  # (method, path)
+
+
+@dataclass
+class RouteDiff:
+    route: Route
+    added: List[str] = field(default_factory=list)  # contract hashes
+    removed: List[str] = field(default_factory=list)
+    discrepancies: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StoreIndex:
+    """
+    Contract hashes of a store by route, built by streaming the contracts file.
+    """
+
+    routes: Dict[Route, List[str]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, contracts_file: str) -> "StoreIndex":
+        index = cls()
+        for contract_hash, contract in iter_contracts(contracts_file):
+            route = (contract["method"].upper(), contract["path"])
+            index.routes.setdefault(route, []).append(contract_hash)
+        return index
+
+
+def load_contracts(contracts_file: str, hashes: Set[str]) -> Dict[str, dict]:
+    """
+    Stream the contracts file and keep only the given contracts.
+    """
+    return {h: c for h, c in iter_contracts(contracts_file) if h in hashes}
+
+
+def compare_contracts(
+    old_contract: dict, new_contract: dict, config: Config
+) -> List[str]:
+    """
+    Compare two recorded contracts of the same route,
+    the old one is the expected one.
+    """
+    old = Contract.from_dict(old_contract)
+    new = Contract.from_dict(new_contract)
+
+    discrepancies = []
+    if old.response_status_code != new.response_status_code:
+        discrepancies.append(
+            f"status code mismatch, expected {old.response_status_code} "
+            f"got {new.response_status_code}"
+        )
+    discrepancies.extend(
+        str(d)
+        for d in new.response_headers.compare(
+            old.response_headers, config.headers_comparison
+        )
+    )
+    discrepancies.extend(
+        str(d)
+        for d in new.response_body.compare(old.response_body, config.body_comparison)
+    )
+    return discrepancies
+
+
+def _compare_pair(args: Tuple[dict, dict, Config]) -> List[str]:
+    return compare_contracts(*args)
+
+
+def diff_stores(
+    old_folder: str, new_folder: str, config: Config, processes: Optional[int] = None
+) -> List[RouteDiff]:
+    """
+    Diff two contract stores without replaying anything.
+    Routes are joined by (method, path), contracts with the same hash are the same.
+    Changed contracts of a route are paired in the recorded order
+    and compared in `processes` worker processes.
+    """
+    old_file = f"{old_folder}/contracts.json"
+    new_file = f"{new_folder}/contracts.json"
+    old_index = StoreIndex.build(old_file)
+    new_index = StoreIndex.build(new_file)
+
+    diffs: Dict[Route, RouteDiff] = {}
+    pairs: List[Tuple[Route, str, str]] = []
+    for route in sorted(set(old_index.routes) | set(new_index.routes)):
+        old_hashes = old_index.routes.get(route, [])
+        new_hashes = new_index.routes.get(route, [])
+        new_set = set(new_hashes)
+        old_set = set(old_hashes)
+        old_changed = [h for h in old_hashes if h not in new_set]
+        new_changed = [h for h in new_hashes if h not in old_set]
+        if not old_changed and not new_changed:
+            continue
+
+        diff = diffs[route] = RouteDiff(route)
+        n = min(len(old_changed), len(new_changed))
+        pairs.extend((route, o, c) for o, c in zip(old_changed[:n], new_changed[:n]))
+        diff.removed.extend(old_changed[n:])
+        diff.added.extend(new_changed[n:])
+
+    old_contracts = load_contracts(old_file, {o for _, o, _ in pairs})
+    new_contracts = load_contracts(new_file, {c for _, _, c in pairs})
+    tasks = [(old_contracts[o], new_contracts[c], config) for _, o, c in pairs]
+
+    if processes and processes > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_compare_pair, tasks, chunksize=64)
+    else:
+        results = [_compare_pair(task) for task in tasks]
+
+    for (route, _, _), discrepancies in zip(pairs, results):
+        diffs[route].discrepancies.extend(discrepancies)
+
+    # a changed contract without any discrepancy by the comparison config
+    return [
+        d for d in diffs.values() if d.added or d.removed or d.discrepancies
+    ]
+
+
+def print_diff(diffs: List[RouteDiff]):
+    for d in diffs:
+        method, path = d.route
+        print("=" * 80)
+        if d.added and not d.removed and not d.discrepancies:
+            cprint(f"Added: {method} {path}", color="green", attrs=["bold"])
+            continue
+        if d.removed and not d.added and not d.discrepancies:
+            cprint(f"Removed: {method} {path}", color="red", attrs=["bold"])
+            continue
+
+        cprint(f"Changed: {method} {path}", color="yellow", attrs=["bold"])
+        for h in d.added:
+            print(f"added contract {h}")
+        for h in d.removed:
+            print(f"removed contract {h}")
+        for discrepancy in d.discrepancies:
+            cprint(discrepancy, color="red")
+
+    print("=" * 80)
+    print(f"{len(diffs)} routes changed")
@@ -1,13 +1,33 @@
-from contractest.config import config
-from contractest.proxy.proxy import APIProxy, contract_store
+import argparse
+
+from contractest.common.metrics import profile_run
+from contractest.config import load_config
+from contractest.proxy.proxy import APIProxy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m contractest.proxy")
+    parser.add_argument("--config", default="conf.toml", help="config file")
+    parser.add_argument("--profile", help="dump cProfile stats of the run to this file")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="report the top memory allocations"
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    config = load_config(args.config)
+    proxy = APIProxy(
+        proxy_host=config.proxy.host,
+        proxy_port=config.proxy.port,
+        config=config,
+        config_file=args.config,
+    )
     try:
-        proxy = APIProxy(
-            proxy_host=config.proxy.host,
-            proxy_port=config.proxy.port,
-        )
-        proxy.run()
+        with profile_run(args.profile, args.trace_memory):
+            proxy.run()
     except KeyboardInterrupt:
-        contract_store.write(path=config.proxy.save_to_folder)
+        proxy.stop_verifier()
+        proxy.write(path=config.proxy.save_to_folder)
         print(f"Contracts written to {config.proxy.save_to_folder}")
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from contractest.common.header import Headers
+
+CacheKey = Tuple[str, str, str, Tuple[str, ...], str]
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    LRU cache of upstream responses with a TTL per entry,
+    safe to use from multiple threads.
+    """
+
+    def __init__(self, max_entries: int, key_headers: List[str]):
+        self.max_entries = max_entries
+        # the bodies are cached as encoded by the upstream,
+        # which depends on the encodings accepted by the client
+        self.key_headers = list(dict.fromkeys([*key_headers, "accept-encoding"]))
+        self.entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(
+        self, upstream: str, method: str, path: str, headers: Headers, body: bytes
+    ) -> CacheKey:
+        return (
+            upstream,
+            method,
+            path,
+            tuple(headers.get(h) for h in self.key_headers),
+            hashlib.md5(body).hexdigest(),
+        )
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            response = self.entries.get(key)
+            if response is None:
+                return None
+            if response.expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return response
+
+    def put(
+        self,
+        key: CacheKey,
+        status_code: int,
+        headers: Dict[str, str],
+        body: bytes,
+        ttl: float,
+    ) -> int:
+        """
+        Cache a response for `ttl` seconds, returns the number of evicted entries.
+        """
+        response = CachedResponse(status_code, headers, body, time.monotonic() + ttl)
+        evicted = 0
+        with self._lock:
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self.entries)
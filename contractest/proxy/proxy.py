@@ -1,100 +1,463 @@
+import json
 import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import threading
+from functools import partial
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing.synchronize import Event
+from typing import Dict, List, Optional
 
-import requests
 from termcolor import cprint
 
-from contractest.common.body import Body
-from contractest.common.contract import Contract
 from contractest.common.header import Headers
-from contractest.common.store import ContractStore
-from contractest.config import config
+from contractest.common.metrics import Metrics, Stages
+from contractest.common.record import ContractRecord, RecordingStore
+from contractest.common.store import merge_folders
+from contractest.config import Config, load_config
+from contractest.proxy.cache import ResponseCache
+from contractest.proxy.router import DEFAULT_UPSTREAM, Router
+from contractest.proxy.verify import ShadowVerifier, print_verification
 
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
+METRICS_PATH = "/__contractest/metrics"
+VERIFY_PATH = "/__contractest/verify"
 
-contract_store = ContractStore()
+# bytes read from the upstream at a time when streaming a response
+CHUNK_SIZE = 64 * 1024
 
 
 class ProxyHandler(BaseHTTPRequestHandler):
     protocol_version = "HTTP/1.1"
 
-    def __init__(self, *args, **kwargs):
-        self.base_url = config.proxy.server_base_url
+    def __init__(self, *args, proxy: "APIProxy", **kwargs):
+        self.proxy = proxy
 
         super().__init__(*args, **kwargs)
 
     def do_GET(self):
-        self._handle_request("get", requests.get)
+        self._handle_request("get")
 
     def do_DELETE(self):
-        self._handle_request("delete", requests.delete)
+        self._handle_request("delete")
 
     def do_POST(self):
-        self._handle_request("post", requests.post)
+        self._handle_request("post")
 
     def do_PUT(self):
-        self._handle_request("put", requests.put)
+        self._handle_request("put")
 
     def do_PATCH(self):
-        self._handle_request("patch", requests.patch)
+        self._handle_request("patch")
 
-    def _handle_request(self, method, requests_func):
+    def _handle_request(self, method):
+        if self.path == METRICS_PATH and self.proxy.config.proxy.metrics:
+            # each worker has its own metrics, a scrape reaches any of them
+            labels = None
+            if self.proxy.worker is not None:
+                labels = {"worker": str(self.proxy.worker)}
+            self._send_text(
+                self.proxy.metrics.to_prometheus(labels), "text/plain; version=0.0.4"
+            )
+            return
+        verifier = self.proxy.verifier
+        if self.path == VERIFY_PATH and verifier is not None:
+            self._send_text(json.dumps(verifier.report(), indent=2), "application/json")
+            return
+
+        metrics = self.proxy.metrics
         req_path = self.path
-        req_headers = Headers.from_dict(self.headers)
+        req_headers = Headers.from_dict(self.headers).without_hop_by_hop()
         req_body = self.rfile.read(
             int(req_headers.get("content-length"))
             if req_headers.has("content-length")
             else 0
         )
-        url = f"{self.base_url}{req_path}"
-
-        log.debug(f"Proxying {method.upper()} {url}")
-        resp = requests_func(
-            url,
-            data=req_body,
-            headers=req_headers.to_dict(),
-            verify=True,
-        )
+        # the router is read once per request,
+        # so a reload does not affect the requests in flight
+        upstream = self.proxy.router.match(req_headers.get("host"), req_path)
+        url = f"{upstream.server_base_url}{req_path}"
+
+        cache = self.proxy.cache
+        cache_key = None
+        cached = None
+        if (
+            cache is not None
+            and upstream.cache_ttl > 0
+            and method in self.proxy.config.proxy.cache_methods
+        ):
+            cache_key = cache.key(
+                upstream.name, method, req_path, req_headers, req_body
+            )
+            cached = cache.get(cache_key)
+
+        if cached is not None:
+            log.debug(f"Cache hit {method.upper()} {url}")
+            metrics.inc("cache_hits")
+            resp_headers_dict = cached.headers
+            resp_body = cached.body
+            resp_status_code = cached.status_code
+            self._send_head(resp_status_code, resp_headers_dict)
+            self.wfile.write(resp_body)
+        else:
+            if cache_key is not None:
+                metrics.inc("cache_misses")
+            # a copy, only the headers sent by the client are recorded
+            forward_headers = dict(req_headers.to_dict())
+            # without it requests would ask for gzip the client may not accept
+            forward_headers.setdefault("accept-encoding", "identity")
+
+            log.debug(f"Proxying {method.upper()} {url}")
+            with metrics.time(Stages.UPSTREAM):
+                resp = upstream.session.request(
+                    method,
+                    url,
+                    data=req_body,
+                    headers=forward_headers,
+                    verify=True,
+                    stream=True,
+                )
+            resp_headers = Headers.from_dict(resp.headers).without_hop_by_hop()
+            resp_headers_dict = resp_headers.to_dict()
+            resp_status_code = resp.status_code
+
+            # the body is forwarded as encoded by the upstream, not decompressed
+            with resp:
+                if resp_headers.has("content-length"):
+                    self._send_head(resp_status_code, resp_headers_dict)
+                    chunks = []
+                    for chunk in resp.raw.stream(CHUNK_SIZE, decode_content=False):
+                        self.wfile.write(chunk)
+                        chunks.append(chunk)
+                    resp_body = b"".join(chunks)
+                else:
+                    # chunked by the upstream, sent with a length to the client
+                    with metrics.time(Stages.UPSTREAM):
+                        resp_body = resp.raw.read(decode_content=False)
+                    if resp_status_code not in (204, 304):
+                        resp_headers_dict["content-length"] = str(len(resp_body))
+                    self._send_head(resp_status_code, resp_headers_dict)
+                    self.wfile.write(resp_body)
 
-        resp_headers = Headers.from_dict(resp.headers)
-        resp_headers_dict = resp_headers.to_dict()
-        resp_body = resp.content
-        resp_status_code = resp.status_code
-
-        contract = Contract(
-            path=req_path,
-            method=method,
-            request_headers=req_headers,
-            request_body=Body(req_body.decode("utf-8"), req_path),
-            response_headers=resp_headers,
-            response_body=Body(resp_body.decode("utf-8"), req_path),
-            response_status_code=resp_status_code,
+            if (
+                cache_key is not None
+                and 200 <= resp_status_code < 300
+                and "no-store" not in resp_headers.get("cache-control")
+            ):
+                evicted = cache.put(  # type: ignore
+                    cache_key,
+                    resp_status_code,
+                    resp_headers_dict,
+                    resp_body,
+                    upstream.cache_ttl,
+                )
+                if evicted:
+                    metrics.inc("cache_evictions", evicted)
+        self.wfile.flush()
+
+        # recorded after the response is sent, the bodies are decoded and parsed
+        # when the contracts are written,
+        # a cache hit is recorded too and deduplicated by its hash on write
+        with metrics.time(Stages.STORE_APPEND):
+            record = ContractRecord(
+                method=method,
+                path=req_path,
+                status_code=resp_status_code,
+                request_headers=req_headers.to_dict(),
+                request_body=req_body,
+                response_headers=resp_headers_dict,
+                response_body=resp_body,
+            )
+            self.proxy.get_store(upstream.name).add(record)
+        metrics.inc("recorded_contracts")
+        # a cached response was verified when it was received
+        if verifier is not None and cached is None:
+            verifier.submit(upstream.name, record)
+        cprint(
+            f"Contract added: [{upstream.name}] {method.upper()} {req_path}"
+            + (" (cached)" if cached is not None else ""),
+            color="green",
         )
-        contract_store.add(contract)
-        cprint(f"Contract added: {method.upper()} {req_path}", color="green")
 
-        self.send_response(resp_status_code)
-        for key in resp_headers_dict:
-            self.send_header(key, resp_headers_dict[key])
+    def _send_head(self, status_code: int, headers: Dict[str, str]):
+        self.send_response(status_code)
+        for key in headers:
+            self.send_header(key, headers[key])
         self.end_headers()
-        self.wfile.write(resp_body)
+
+    def _send_text(self, text: str, content_type: str):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
         self.wfile.flush()
 
 
+class ReusePortHTTPServer(HTTPServer):
+    """
+    HTTPServer binding with SO_REUSEPORT,
+    so the kernel balances the connections between the worker processes.
+    """
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
 class APIProxy:
     def __init__(
         self,
         proxy_host="127.0.0.1",
         proxy_port=6000,
+        config: Optional[Config] = None,
+        config_file: Optional[str] = None,
+        worker: Optional[int] = None,
     ) -> None:
         self.proxy_host = proxy_host
         self.proxy_port = proxy_port
+        self.config = config or Config()
+        self.config_file = config_file
+        self.worker = worker  # the index of the worker process, if any
+        self.router = Router(self.config.proxy)
+        self.cache = create_cache(self.config)
+        self.metrics = Metrics()
+        # started in `serve`, so each worker process has its own thread
+        self.verifier: Optional[ShadowVerifier] = None
+        # a store (namespace) per upstream
+        self.contract_stores: Dict[str, RecordingStore] = {}
+        # where the workers wrote their segments, they are merged on write
+        self.segments_path: Optional[str] = None
+
+    def get_store(self, upstream_name: str) -> RecordingStore:
+        store = self.contract_stores.get(upstream_name)
+        if store is None:
+            store = self.contract_stores[upstream_name] = RecordingStore(
+                memory_limit=self.config.proxy.memory_limit_mb * 1024 * 1024
+            )
+        return store
+
+    def write(self, path: str) -> None:
+        """
+        Write the contracts of the default upstream to `path`
+        and the contracts of the other upstreams to `path/<upstream name>`.
+        """
+        for name, store in self.contract_stores.items():
+            store.write(_store_path(path, name), self.metrics)
+        if self.segments_path is None:
+            return
+        for name, segment_paths in find_segments(self.segments_path).items():
+            merge_folders(segment_paths, _store_path(path, name))
+        shutil.rmtree(self.segments_path, ignore_errors=True)
+        self.segments_path = None
+
+    def stop_verifier(self) -> None:
+        """
+        Verify the queued exchanges and print the results per route.
+        """
+        if self.verifier is None:
+            return
+        self.verifier.stop()
+        print_verification(self.verifier.report())
+
+    def reload_config(self, *_) -> None:
+        """
+        Reload the config from the config file.
+        Host and port can not be changed without a restart.
+        """
+        if not self.config_file:
+            return
+        try:
+            new_config = load_config(self.config_file)
+            new_router = Router(new_config.proxy)
+            # the cached responses may be of the old upstreams
+            new_cache = create_cache(new_config)
+        except Exception as e:
+            log.error(
+                f"Failed to reload config from {self.config_file}, "
+                f"keeping the current config: {e}"
+            )
+            return
+
+        # swapping the references is atomic, the recorded contracts are kept
+        old_router = self.router
+        self.config, self.router, self.cache = new_config, new_router, new_cache
+        # the idle connections are closed, the ones of the requests in flight
+        # are discarded when those requests finish
+        old_router.close()
+        if self.verifier is not None:
+            self.verifier.config = new_config
+        print(f"Config reloaded, proxying to {self.config.proxy.server_base_url}")
 
     def run(self) -> None:
-        server_address = (self.proxy_host, self.proxy_port)
-        httpd = HTTPServer(server_address, ProxyHandler)
         print(f"Starting proxy server on {self.proxy_host}:{self.proxy_port}")
-        print(f"Proxying to {config.proxy.server_base_url}")
+        print(f"Proxying to {self.config.proxy.server_base_url}")
+        for route in self.config.proxy.routes:
+            print(
+                f"Proxying {route.host or '*'}{route.path_prefix or '/'} "
+                f"to {route.server_base_url} ({route.name})"
+            )
+
+        if self.config.proxy.workers > 1:
+            self._run_workers(self.config.proxy.workers)
+        else:
+            self.serve()
+
+    def serve(
+        self,
+        reuse_port: bool = False,
+        listen_socket: Optional[socket.socket] = None,
+        stop_event: Optional[Event] = None,
+    ) -> None:
+        """
+        Serve until interrupted, or until `stop_event` is set (in a worker).
+        """
+        if self.config.proxy.reload_on_sighup and hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.reload_config)
+        if self.config.proxy.verify_from_folder:
+            self.verifier = ShadowVerifier(self.config, self.metrics)
+            self.verifier.start()
+
+        server_address = (self.proxy_host, self.proxy_port)
+        handler = partial(ProxyHandler, proxy=self)
+        if listen_socket is not None:
+            httpd = HTTPServer(server_address, handler, bind_and_activate=False)
+            httpd.socket.close()
+            httpd.socket = listen_socket
+        elif reuse_port:
+            httpd = ReusePortHTTPServer(server_address, handler)
+        else:
+            httpd = HTTPServer(server_address, handler)
+        if stop_event is not None:
+            threading.Thread(
+                target=_shutdown_on_event, args=(httpd, stop_event), daemon=True
+            ).start()
         httpd.serve_forever()
+        httpd.server_close()
+
+    def _run_workers(self, workers: int) -> None:
+        """
+        Run the proxy in worker processes sharing the port.
+        Each worker writes its contracts to a segment on exit,
+        the segments are merged by `write`, they are removed after that.
+        The workers ignore Ctrl+C and are stopped with an event,
+        the KeyboardInterrupt is re-raised once they have written their segments.
+        The workers build their own proxy from the config,
+        so it works with the spawn start method too.
+        """
+        segments_path = os.path.join(self.config.proxy.save_to_folder, ".segments")
+        shutil.rmtree(segments_path, ignore_errors=True)
+
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        listen_socket = None
+        if not reuse_port:
+            # pre-forked socket, the workers accept on the same socket
+            listen_socket = socket.create_server((self.proxy_host, self.proxy_port))
+
+        stop_event = multiprocessing.Event()
+        processes = [
+            multiprocessing.Process(
+                target=_run_worker,
+                args=(
+                    self.config,
+                    self.config_file,
+                    self.proxy_host,
+                    self.proxy_port,
+                    i,
+                    os.path.join(segments_path, str(i)),
+                    reuse_port,
+                    listen_socket,
+                    stop_event,
+                ),
+            )
+            for i in range(workers)
+        ]
+        # ignored while starting, so a Ctrl+C can not interrupt a starting worker
+        previous_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGINT, previous_handler)
+        print(f"Started {workers} workers")
+
+        if self.config.proxy.reload_on_sighup and hasattr(signal, "SIGHUP"):
+            signal.signal(
+                signal.SIGHUP, lambda *_: _signal_workers(processes, signal.SIGHUP)
+            )
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            stop_event.set()
+            for process in processes:
+                process.join()
+
+            self.segments_path = segments_path
+            raise
+
+
+def create_cache(config: Config) -> Optional[ResponseCache]:
+    if not config.proxy.cache:
+        return None
+    return ResponseCache(config.proxy.cache_max_entries, config.proxy.cache_key_headers)
+
+
+def _run_worker(
+    config: Config,
+    config_file: Optional[str],
+    proxy_host: str,
+    proxy_port: int,
+    worker: int,
+    segment_path: str,
+    reuse_port: bool,
+    listen_socket: Optional[socket.socket],
+    stop_event: Event,
+) -> None:
+    # Ctrl+C reaches the workers from the terminal too,
+    # they are stopped by the parent with `stop_event` only
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    proxy = APIProxy(proxy_host, proxy_port, config, config_file, worker)
+    proxy.serve(reuse_port, listen_socket, stop_event)
+    proxy.stop_verifier()
+    for name, store in proxy.contract_stores.items():
+        store.write(os.path.join(segment_path, name), proxy.metrics)
+
+
+def _shutdown_on_event(httpd: HTTPServer, stop_event: Event) -> None:
+    stop_event.wait()
+    httpd.shutdown()
+
+
+def _signal_workers(processes: List[multiprocessing.Process], signum: int) -> None:
+    for process in processes:
+        if process.is_alive() and process.pid is not None:
+            os.kill(process.pid, signum)
+
+
+def find_segments(segments_path: str) -> Dict[str, List[str]]:
+    """
+    The segments written by the workers (`<worker>/<upstream name>`) per upstream,
+    in the order of the workers.
+    """
+    if not os.path.isdir(segments_path):
+        return {}
+
+    segments: Dict[str, List[str]] = {}
+    for worker in sorted(os.listdir(segments_path), key=int):
+        worker_path = os.path.join(segments_path, worker)
+        for name in sorted(os.listdir(worker_path)):
+            segments.setdefault(name, []).append(os.path.join(worker_path, name))
+    return segments
+
+
+def _store_path(path: str, upstream_name: str) -> str:
+    if upstream_name == DEFAULT_UPSTREAM:
+        return path
+    return os.path.join(path, upstream_name)
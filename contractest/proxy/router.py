@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import requests
+
+from contractest.config import ProxyConfig, RouteConfig
+
+DEFAULT_UPSTREAM = "default"
+
+
+@dataclass
+class Upstream:
+    name: str
+    server_base_url: str
+    session: requests.Session  # connection pool of this upstream
+    cache_ttl: float = 0.0  # seconds, 0 is not cached
+
+
+class Router:
+    """
+    Route a request to an upstream by Host header and/or path prefix.
+    Rules with a host come first, then the longest path prefix wins.
+    A path prefix matches whole path segments, `/users` matches `/users`,
+    `/users/1` and `/users?id=1` but not `/users-admin`.
+    Requests not matching any rule go to the default `server_base_url`.
+    """
+
+    def __init__(self, proxy_config: ProxyConfig):
+        for route in proxy_config.routes:
+            if route.name == DEFAULT_UPSTREAM:
+                # it would share the store and folder of the default upstream
+                raise ValueError(f"Route name {DEFAULT_UPSTREAM!r} is reserved")
+
+        self.default = Upstream(
+            DEFAULT_UPSTREAM,
+            proxy_config.server_base_url,
+            requests.Session(),
+            proxy_config.cache_ttl,
+        )
+        self.rules: List[RouteConfig] = sorted(
+            proxy_config.routes,
+            key=lambda r: (r.host is not None, len(r.path_prefix)),
+            reverse=True,
+        )
+        self.upstreams = {
+            r.name: Upstream(
+                r.name,
+                r.server_base_url,
+                requests.Session(),
+                proxy_config.cache_ttl if r.cache_ttl is None else r.cache_ttl,
+            )
+            for r in self.rules
+        }
+
+    def match(self, host: Optional[str], path: str) -> Upstream:
+        # the Host header can have the port
+        host = host.split(":", 1)[0].lower() if host else None
+        for rule in self.rules:
+            if rule.host is not None and rule.host.lower() != host:
+                continue
+            if _match_prefix(path, rule.path_prefix):
+                return self.upstreams[rule.name]
+        return self.default
+
+    def close(self):
+        self.default.session.close()
+        for upstream in self.upstreams.values():
+            upstream.session.close()
+
+
+def _match_prefix(path: str, prefix: str) -> bool:
+    if not path.startswith(prefix):
+        return False
+    if len(path) == len(prefix) or prefix == "" or prefix.endswith("/"):
+        return True
+    return path[len(prefix)] in "/?"
@@ -0,0 +1,201 @@
+import logging
+import os
+import queue
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from termcolor import cprint
+
+from contractest.common.contract import Contract
+from contractest.common.metrics import Metrics, Stages
+from contractest.common.record import ContractRecord
+from contractest.common.store import ContractStore
+from contractest.config import Config
+from contractest.proxy.router import DEFAULT_UPSTREAM
+
+log = logging.getLogger(__name__)
+
+ContractIndex = Dict[Tuple[str, str], List[Contract]]
+
+
+@dataclass
+class RouteVerification:
+    checked: int = 0
+    failed: int = 0
+    unmatched: int = 0  # exchanges without a recorded contract
+    # "<discrepancy type> <field>" to the times it was seen
+    mismatches: Dict[str, int] = field(default_factory=dict)
+
+
+class ShadowVerifier:
+    """
+    Compare the proxied exchanges with the contracts of an already recorded
+    store on a background thread, off the response path.
+    The store of an upstream is read from `verify_from_folder/<upstream name>`,
+    the default upstream from `verify_from_folder`, like the proxy writes them.
+    An exchange fails like in the test service, on the status code or the body,
+    header mismatches are counted but do not fail it.
+    The results are kept per upstream and route (`<METHOD> <path>`).
+    """
+
+    def __init__(self, config: Config, metrics: Metrics):
+        self.config = config  # replaced on config reload
+        self.verify_from_folder = config.proxy.verify_from_folder
+        self.metrics = metrics
+        self.routes: Dict[Tuple[str, str], RouteVerification] = {}
+        self.queue: "queue.Queue[Optional[Tuple[str, ContractRecord]]]" = queue.Queue(
+            maxsize=config.proxy.verify_queue_size
+        )
+        self._indexes: Dict[str, ContractIndex] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="contractest-verify", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, upstream_name: str, record: ContractRecord):
+        """
+        Queue an exchange to verify, it is dropped if the queue is full
+        rather than slowing down the proxy.
+        """
+        try:
+            self.queue.put_nowait((upstream_name, record))
+        except queue.Full:
+            self.metrics.inc("verify_dropped")
+
+    def stop(self):
+        """
+        Verify the queued exchanges and stop the thread.
+        """
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.verify(*item)
+            except Exception as e:
+                record = item[1]
+                log.error(f"Failed to verify {record.method.upper()} {record.path}: {e}")
+
+    def verify(self, upstream_name: str, record: ContractRecord):
+        metrics = self.metrics
+        with metrics.time(Stages.BODY_PARSING):
+            contract = record.to_contract()
+        expected = self._find(upstream_name, contract)
+        name = f"{contract.method.upper()} {contract.path}"
+
+        if expected is None:
+            with self._lock:
+                self._route(upstream_name, name).unmatched += 1
+            metrics.inc("verify_unmatched")
+            return
+
+        mismatches = []
+        with metrics.time(Stages.COMPARISON):
+            if contract.response_status_code != expected.response_status_code:
+                mismatches.append("status_code")
+                failed = True
+            else:
+                header_discrepancies = contract.response_headers.compare(
+                    expected.response_headers, self.config.headers_comparison
+                )
+                body_discrepancies = contract.response_body.compare(
+                    expected.response_body, self.config.body_comparison
+                )
+                mismatches.extend(
+                    f"{d.discrepancy_type} {d.path}"
+                    for d in header_discrepancies + body_discrepancies
+                )
+                failed = bool(body_discrepancies)
+
+        with self._lock:
+            route = self._route(upstream_name, name)
+            route.checked += 1
+            route.failed += failed
+            for mismatch in mismatches:
+                route.mismatches[mismatch] = route.mismatches.get(mismatch, 0) + 1
+        metrics.inc("verify_checked")
+        if failed:
+            metrics.inc("verify_failed")
+            log.warning(f"Contract drift [{upstream_name}] {name}: {mismatches}")
+
+    def _route(self, upstream_name: str, name: str) -> RouteVerification:
+        route = self.routes.get((upstream_name, name))
+        if route is None:
+            route = self.routes[(upstream_name, name)] = RouteVerification()
+        return route
+
+    def _find(self, upstream_name: str, contract: Contract) -> Optional[Contract]:
+        """
+        The recorded contract of the same method and path,
+        the one with the same request body if there are more.
+        """
+        index = self._indexes.get(upstream_name)
+        if index is None:
+            index = self._indexes[upstream_name] = self._load_index(upstream_name)
+
+        candidates = index.get((contract.method, contract.path))
+        if not candidates:
+            return None
+        request_body = contract.request_body.to_value()
+        for candidate in candidates:
+            if candidate.request_body.to_value() == request_body:
+                return candidate
+        return candidates[0]
+
+    def _load_index(self, upstream_name: str) -> ContractIndex:
+        path = self.verify_from_folder
+        if upstream_name != DEFAULT_UPSTREAM:
+            path = os.path.join(path, upstream_name)
+
+        index: ContractIndex = {}
+        if not os.path.isfile(os.path.join(path, "contracts.json")):
+            log.warning(f"No contracts to verify [{upstream_name}] in {path}")
+            return index
+
+        store = ContractStore()
+        store.load(
+            path, verbose=False, cache_dir=self.config.test_service.store_cache_dir
+        )
+        for contract in store.get_all():
+            index.setdefault((contract.method, contract.path), []).append(contract)
+        return index
+
+    def report(self) -> Dict[str, Dict[str, dict]]:
+        """
+        The results by upstream name and route.
+        """
+        report: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (upstream_name, name), route in sorted(self.routes.items()):
+                report.setdefault(upstream_name, {})[name] = asdict(route)
+        return report
+
+
+def print_verification(report: Dict[str, Dict[str, dict]]):
+    print("=" * 80)
+    for upstream_name, routes in report.items():
+        for name, route in routes.items():
+            if route["failed"]:
+                color = "red"
+            elif route["unmatched"]:
+                color = "yellow"
+            else:
+                color = "green"
+            cprint(
+                f"[{upstream_name}] {name}: {route['checked']} verified, "
+                f"{route['failed']} failed, {route['unmatched']} without a contract",
+                color=color,
+                attrs=["bold"],
+            )
+            mismatches = sorted(route["mismatches"].items(), key=lambda m: -m[1])
+            for mismatch, count in mismatches:
+                cprint(f"  {count:>6} x {mismatch}", color="red")
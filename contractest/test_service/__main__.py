@@ -1,17 +1,78 @@
-from contractest.common.store import ContractStore
-from contractest.config import config
-from contractest.test_service.server import ContractServerTester
+import argparse
 
-if __name__ == "__main__":
-    contract_store = ContractStore()
-    contract_store.load(config.test_service.load_from_folder)
+from contractest.common.metrics import Metrics, profile_run
+from contractest.config import load_config
+from contractest.test_service.last_run import Selection, save_last_run
+from contractest.test_service.result import merge_results, print_report, write_results
+from contractest.test_service.runner import load_store, run_shards_locally, run_tests
+from contractest.test_service.shard import parse_shard
 
-    if not contract_store.get_all():
-        print("No contracts found, exiting")
-        exit(1)
 
-    contract_server_tester = ContractServerTester(
-        config.test_service.server_base_url,
-        contract_store,
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m contractest.test_service")
+    parser.add_argument("--config", default="conf.toml", help="config file")
+    parser.add_argument(
+        "--shard", type=parse_shard, help="run only shard i of n, like 1/4"
+    )
+    parser.add_argument(
+        "--processes", type=int, help="run all shards in this many local processes"
+    )
+    parser.add_argument("--results", help="write the results to this json file")
+    parser.add_argument(
+        "--select",
+        choices=[Selection.FAILED_FIRST, Selection.ONLY_FAILED, Selection.CHANGED],
+        help="select or reorder the contracts by the results of the last run",
     )
-    contract_server_tester.test()
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="RESULTS",
+        help="merge result files (of shards) into one report, nothing is run",
+    )
+    parser.add_argument("--profile", help="dump cProfile stats of the run to this file")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="report the top memory allocations"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    metrics = Metrics()
+
+    if args.merge:
+        results = merge_results(args.merge)
+    else:
+        config = load_config(args.config)
+        with profile_run(args.profile, args.trace_memory):
+            if args.processes and args.processes > 1:
+                results = run_shards_locally(
+                    config, args.processes, args.select, metrics
+                )
+                save_last_run(config.test_service.last_run_file, results)
+            else:
+                contract_store = load_store(config)
+
+                if not contract_store.get_all():
+                    print("No contracts found, exiting")
+                    exit(1)
+
+                results = run_tests(
+                    config, contract_store, args.shard, args.select, metrics=metrics
+                )
+                save_last_run(
+                    config.test_service.last_run_file,
+                    results,
+                    contract_store.contracts.keys(),
+                )
+
+    if args.results:
+        shard = "{}/{}".format(*args.shard) if args.shard else None
+        write_results(args.results, results, shard=shard)
+
+    print_report(results)
+    if metrics.stages:
+        print(metrics.summary())
+    if not all(r.passed for r in results):
+        exit(1)
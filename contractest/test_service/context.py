@@ -0,0 +1,33 @@
+from dataclasses import replace
+from typing import Any, Dict, Optional
+
+from contractest.common.contract import Contract, ContractFlow
+
+
+class ExecutionContext:
+    """
+    Run-local state of a test run.
+    Holds the flow variables and materializes the outgoing requests
+    from the loaded (immutable) contracts, so the same store can be
+    replayed many times or by concurrent workers.
+    """
+
+    def __init__(self, variables: Optional[Dict[str, Any]] = None):
+        self.variables: Dict[str, Any] = dict(variables or {})
+
+    def materialize(self, flow: ContractFlow, contract: Contract) -> Contract:
+        """
+        Make the contract to send for this flow step.
+        Without any `use` the loaded contract is returned as it is,
+        otherwise a shallow copy where only the modified request parts are copied.
+        """
+        if not flow.use:
+            return contract
+
+        request = replace(contract)
+        for flow_use in flow.use:
+            flow_use.set_param_value_in_contract(request, self.variables[flow_use.key])
+        return request
+
+    def store(self, key: str, value: Any):
+        self.variables[key] = value
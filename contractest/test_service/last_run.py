@@ -0,0 +1,81 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+from contractest.common.contract import ContractFlow
+from contractest.test_service.result import ContractTestResult
+from contractest.test_service.shard import flow_chains
+
+
+class Selection:
+    FAILED_FIRST = "failed-first"
+    ONLY_FAILED = "only-failed"
+    CHANGED = "changed"  # contracts added or changed since the last run
+
+
+def load_last_run(path: str) -> Dict[str, ContractTestResult]:
+    """
+    Load the last result of each contract by contract hash.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        data = json.loads(f.read())
+    return {h: ContractTestResult.from_dict(r) for h, r in data.items()}
+
+
+def save_last_run(
+    path: str,
+    results: List[ContractTestResult],
+    contract_hashes: Optional[Iterable[str]] = None,
+):
+    """
+    Update the last results with the results of this run.
+    If the hashes of the loaded contracts are given,
+    the results of contracts not in the store anymore are dropped.
+    """
+    last_run = load_last_run(path)
+    if contract_hashes is not None:
+        known = set(contract_hashes)
+        last_run = {h: r for h, r in last_run.items() if h in known}
+    for r in results:
+        last_run[r.contract_hash] = r
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(json.dumps({h: r.to_dict() for h, r in last_run.items()}))
+
+
+def select_flow(
+    flow: List[ContractFlow],
+    last_run: Dict[str, ContractTestResult],
+    selection: str,
+) -> List[ContractFlow]:
+    """
+    Select or reorder the flow by the last results.
+    Chains of dependent steps are selected and moved as a whole.
+    """
+    chains = flow_chains(flow)
+
+    def failed(chain: List[int]) -> bool:
+        results = (last_run.get(flow[i].contract_hash) for i in chain)
+        return any(r is not None and not r.passed for r in results)
+
+    def changed(chain: List[int]) -> bool:
+        return any(flow[i].contract_hash not in last_run for i in chain)
+
+    if selection == Selection.FAILED_FIRST:
+        chains = sorted(chains, key=lambda chain: not failed(chain))
+        return [flow[i] for chain in chains for i in chain]
+    if selection == Selection.ONLY_FAILED:
+        chains = [chain for chain in chains if failed(chain)]
+    elif selection == Selection.CHANGED:
+        chains = [chain for chain in chains if changed(chain)]
+    else:
+        raise ValueError(
+            f"Invalid selection {selection}, "
+            f"only {Selection.FAILED_FIRST}, {Selection.ONLY_FAILED} "
+            f"and {Selection.CHANGED} are supported"
+        )
+    return [flow[i] for i in sorted(i for chain in chains for i in chain)]
@@ -0,0 +1,68 @@
+import json
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from termcolor import cprint
+
+
+@dataclass
+class ContractTestResult:
+    contract_hash: str
+    method: str
+    path: str
+    passed: bool
+    duration: float
+    discrepancies: List[str] = field(default_factory=list)
+    response_fingerprint: str = ""  # md5 of the response body
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ContractTestResult":
+        return cls(**data)
+
+
+def write_results(
+    path: str, results: List[ContractTestResult], shard: Optional[str] = None
+):
+    with open(path, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "shard": shard,
+                    "results": [r.to_dict() for r in results],
+                },
+                indent=2,
+            )
+        )
+
+
+def read_results(path: str) -> List[ContractTestResult]:
+    with open(path, "r") as f:
+        data = json.loads(f.read())
+    return [ContractTestResult.from_dict(r) for r in data["results"]]
+
+
+def merge_results(paths: List[str]) -> List[ContractTestResult]:
+    """
+    Merge result files (of shards) into one list, in the order of the files.
+    """
+    results = []
+    for path in paths:
+        results.extend(read_results(path))
+    return results
+
+
+def print_report(results: List[ContractTestResult]):
+    failed = [r for r in results if not r.passed]
+
+    print("=" * 80)
+    for r in failed:
+        cprint(f"Failed: {r.method.upper()} {r.path} : {r.contract_hash}", color="red")
+    cprint(
+        f"{len(results) - len(failed)} passed, {len(failed)} failed, "
+        f"{sum(r.duration for r in results):.2f}s",
+        color="red" if failed else "green",
+        attrs=["bold"],
+    )
@@ -0,0 +1,77 @@
+from typing import Dict, List, Optional, Tuple
+
+from contractest.common.metrics import Metrics, StageTiming
+from contractest.common.store import ContractStore
+from contractest.config import Config
+from contractest.test_service.last_run import load_last_run, select_flow
+from contractest.test_service.result import ContractTestResult
+from contractest.test_service.shard import select_shard
+
+
+def load_store(config: Config) -> ContractStore:
+    contract_store = ContractStore()
+    contract_store.load(
+        config.test_service.load_from_folder,
+        cache_dir=config.test_service.store_cache_dir,
+    )
+    return contract_store
+
+
+def run_tests(
+    config: Config,
+    contract_store: ContractStore,
+    shard: Optional[Tuple[int, int]] = None,
+    selection: Optional[str] = None,
+    last_run: Optional[Dict[str, ContractTestResult]] = None,
+    metrics: Optional[Metrics] = None,
+) -> List[ContractTestResult]:
+    flow = contract_store.flow
+    if shard is not None:
+        flow = select_shard(flow, *shard)
+        print(f"Shard {shard[0]}/{shard[1]}: {len(flow)} of {len(contract_store.flow)}")
+    if selection is not None:
+        if last_run is None:
+            last_run = load_last_run(config.test_service.last_run_file)
+        flow = select_flow(flow, last_run, selection)
+        print(f"Selected {selection}: {len(flow)} of {len(contract_store.flow)}")
+
+    # requests is imported only when the tests are run
+    from contractest.test_service.server import ContractServerTester
+
+    contract_server_tester = ContractServerTester(
+        config.test_service.server_base_url,
+        contract_store,
+        config,
+        metrics,
+    )
+    return contract_server_tester.test(flow=flow)
+
+
+def _run_shard(
+    config: Config, shard: Tuple[int, int], selection: Optional[str]
+) -> Tuple[List[ContractTestResult], Dict[str, StageTiming]]:
+    metrics = Metrics()
+    results = run_tests(config, load_store(config), shard, selection, metrics=metrics)
+    return results, metrics.stages
+
+
+def run_shards_locally(
+    config: Config,
+    processes: int,
+    selection: Optional[str] = None,
+    metrics: Optional[Metrics] = None,
+) -> List[ContractTestResult]:
+    """
+    Run all the shards, one process per shard, and merge the results.
+    """
+    import multiprocessing
+
+    with multiprocessing.Pool(processes) as pool:
+        shard_results = pool.starmap(
+            _run_shard,
+            [(config, (i, processes), selection) for i in range(1, processes + 1)],
+        )
+    if metrics is not None:
+        for _, stages in shard_results:
+            metrics.merge(stages)
+    return [r for results, _ in shard_results for r in results]
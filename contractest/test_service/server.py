@@ -1,5 +1,7 @@
+import hashlib
 import logging
-from typing import Any, Dict
+import time
+from typing import List, Optional
 
 import requests
 from termcolor import cprint
@@ -7,44 +9,94 @@ from termcolor import cprint
 from contractest.common.body import Body
 from contractest.common.contract import Contract, ContractFlow
 from contractest.common.header import Headers
+from contractest.common.metrics import Metrics, Stages
 from contractest.common.store import ContractStore
+from contractest.config import Config
+from contractest.test_service.context import ExecutionContext
+from contractest.test_service.result import ContractTestResult
 
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
-simple_store: Dict[str, Any] = {}
-
 
 class ContractServerTester:
-    def __init__(self, base_url: str, contract_store: ContractStore) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        contract_store: ContractStore,
+        config: Optional[Config] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
         self.base_url = base_url
         self.contract_store = contract_store
+        self.config = config or Config()
+        self.metrics = metrics or Metrics()
+
+    def test(
+        self,
+        context: Optional[ExecutionContext] = None,
+        flow: Optional[List[ContractFlow]] = None,
+    ) -> List[ContractTestResult]:
+        """
+        Run the flow (or the given part of it) once.
+        Each run gets its own context unless one is given,
+        the loaded contracts are never modified.
+        """
+        context = context or ExecutionContext()
+        results = []
+        for flow_step in self.contract_store.flow if flow is None else flow:
+            contract = self.contract_store.get(flow_step.contract_hash)
+            start = time.perf_counter()
+            result = self._test_contract(flow_step, contract, context)
+            result.duration = time.perf_counter() - start
+            results.append(result)
+        return results
+
+    def _test_contract(
+        self, flow: ContractFlow, contract: Contract, context: ExecutionContext
+    ) -> ContractTestResult:
+        result = ContractTestResult(
+            contract_hash=flow.contract_hash,
+            method=contract.method,
+            path=contract.path,
+            passed=False,
+            duration=0.0,
+        )
 
-    def test(self):
-        for flow in self.contract_store.flow:
-            contract = self.contract_store.get(flow.contract_hash)
-            self._test_contract(flow, contract)
-
-    def _test_contract(self, flow: ContractFlow, contract: Contract):
         print("=" * 80)
         cprint(
             f"Testing: {contract.method.upper()} {contract.path}",
             attrs=["bold"],
         )
 
-        # modify contract with values from store
-        for flow_use in flow.use:
-            flow_use.set_param_value_in_contract(contract, simple_store[flow_use.key])
-
-        log.debug("Request: %s", contract.request_body.dict)
-
-        response = requests.request(
-            contract.method,
-            f"{self.base_url}{contract.path}",
-            headers=contract.request_headers.to_dict(),
-            json=contract.request_body.body,
-            timeout=10,
-        )
+        # make the request with values from the context
+        contract = context.materialize(flow, contract)
+
+        # log what is sent, `use` values are set on the dict of json bodies
+        metrics = self.metrics
+        request_body = contract.request_body
+        if request_body.is_raw_xml or request_body.is_text:
+            log.debug("Request: %s", request_body.body)
+            body = {"data": request_body.body.encode("utf-8")}
+        else:
+            log.debug("Request: %s", request_body.dict)
+            body = {"json": request_body.dict}
+
+        headers = dict(contract.request_headers.to_dict())
+        # the proxy records the response of `identity` if the client sent none,
+        # requests would ask for gzip otherwise
+        headers.setdefault("accept-encoding", "identity")
+
+        with metrics.time(Stages.UPSTREAM):
+            response = requests.request(
+                contract.method,
+                f"{self.base_url}{contract.path}",
+                headers=headers,
+                timeout=10,
+                **body,
+            )
+        with metrics.time(Stages.HASHING):
+            result.response_fingerprint = hashlib.md5(response.content).hexdigest()
 
         if response.status_code != contract.response_status_code:
             cprint(
@@ -54,38 +106,54 @@ class ContractServerTester:
                 f"Got response body: {response.text}",
                 color="red",
             )
-            return
+            result.discrepancies.append(
+                f"status code mismatch, expected {contract.response_status_code} "
+                f"got {response.status_code}"
+            )
+            return result
 
-        response_headers = Headers.from_dict(response.headers)
-        response_body = Body(response.text, contract.path)
+        with metrics.time(Stages.BODY_PARSING):
+            response_headers = Headers.from_dict(response.headers)
+            response_body = Body(
+                response.text, contract.path, response.headers.get("content-type")
+            )
 
-        log.debug("Response: %s", response_body.dict)
+        log.debug("Response: %s", response_body.body)
 
         # store values from response
         for flow_store in flow.store:
-            simple_store[flow_store.key] = flow_store.parse_param_value_from_response(
-                response
+            context.store(
+                flow_store.key,
+                flow_store.parse_param_value_from_response(response, response_body),
             )
 
-        contract_headers = contract.response_headers
-        header_discrepancies = response_headers.compare(contract_headers)
-        for d in header_discrepancies:
-            cprint(
-                "Failed, headers mismatch \n" f"{d}",
-                color="red",
+        with metrics.time(Stages.COMPARISON):
+            header_discrepancies = response_headers.compare(
+                contract.response_headers, self.config.headers_comparison
             )
-
-        contract_body = contract.response_body
-        body_discrepancies = response_body.compare(contract_body)
-        for d in body_discrepancies:
-            cprint(
-                "Failed, body mismatch \n" f"{d}",
-                color="red",
+            body_discrepancies = response_body.compare(
+                contract.response_body, self.config.body_comparison
             )
 
+        with metrics.time(Stages.REPORTING):
+            for d in header_discrepancies:
+                cprint(
+                    "Failed, headers mismatch \n" f"{d}",
+                    color="red",
+                )
+            for d in body_discrepancies:
+                cprint(
+                    "Failed, body mismatch \n" f"{d}",
+                    color="red",
+                )
+        result.discrepancies.extend(str(d) for d in header_discrepancies)
+        result.discrepancies.extend(str(d) for d in body_discrepancies)
+
         if body_discrepancies:
             # print(print_dict_str(response_body.dict, body_discrepancies))
             # pprint(response_body.dict)
-            return
+            return result
 
         cprint("Passed!", color="green")
+        result.passed = True
+        return result
@@ -0,0 +1,62 @@
+import argparse
+from typing import Dict, List, Tuple
+
+from contractest.common.contract import ContractFlow
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse `i/n` (1-based) to (i, n), the type of the `--shard` argument.
+    """
+    try:
+        index, count = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {shard}, expected i/n like 1/4")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"invalid shard {shard}, i must be between 1 and n"
+        )
+    return index, count
+
+
+def flow_chains(flow: List[ContractFlow]) -> List[List[int]]:
+    """
+    Group the flow steps (by index) into chains of dependent steps.
+    A step using a key is in the same chain as the steps storing it.
+    """
+    parent = list(range(len(flow)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    stored_by: Dict[str, int] = {}
+    for i, step in enumerate(flow):
+        for flow_use in step.use:
+            if flow_use.key in stored_by:
+                parent[find(i)] = find(stored_by[flow_use.key])
+        for flow_store in step.store:
+            if flow_store.key in stored_by:
+                parent[find(i)] = find(stored_by[flow_store.key])
+            stored_by[flow_store.key] = i
+
+    chains: Dict[int, List[int]] = {}
+    for i in range(len(flow)):
+        chains.setdefault(find(i), []).append(i)
+    return list(chains.values())
+
+
+def select_shard(flow: List[ContractFlow], index: int, count: int) -> List[ContractFlow]:
+    """
+    Select the flow steps of shard `index` of `count` (1-based).
+    A chain goes to a shard by the hash of its first contract,
+    so the selection is stable between runs and machines.
+    The order of the flow is kept.
+    """
+    selected = []
+    for chain in flow_chains(flow):
+        if int(flow[chain[0]].contract_hash, 16) % count == index - 1:
+            selected.extend(chain)
+    return [flow[i] for i in sorted(selected)]
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+from contractest.common import body
+from contractest.common.body import Body, find_mismatch_of_numbers
+from contractest.common.discrepancy import DiscrepancyTypes
+from contractest.config import BodyComparisonConfig
+
+
+def test_content_type_from_header():
+    assert Body("<html><br></html>", "/", "text/html").content_type == "text/plain"
+    assert Body("<a/>", "/", "application/xml; charset=utf-8").is_raw_xml
+    assert Body("[1]", "/", "application/problem+json").content_type == (
+        "application/json"
+    )
+    # guessed from the body only without the header
+    assert Body("<a/>", "/").is_raw_xml
+    assert Body("{}", "/").content_type == "application/json"
+
+
+def test_compare_text():
+    html = Body("<html><br></html>", "/", "text/html")
+
+    assert html.compare(Body("<html><br></html>", "/", "text/html")) == []
+    [discrepancy] = html.compare(Body("<html></html>", "/", "text/html"))
+    assert discrepancy.discrepancy_type == DiscrepancyTypes.VALUE_MISMATCH
+    [discrepancy] = html.compare(Body('{"a": 1}', "/", "application/json"))
+    assert discrepancy.discrepancy_type == DiscrepancyTypes.TYPE_MISMATCH
+    assert html.to_value() == "<html><br></html>"
+
+
+def test_compare_invalid_xml():
+    invalid = Body("<a><b></a>", "/", "application/xml")
+
+    [discrepancy] = invalid.compare(Body("<a><b></a>", "/", "application/xml"))
+    assert discrepancy.msg == "invalid XML"
+
+
+INF = math.inf
+NAN = math.nan
+TOLERANT = BodyComparisonConfig(numeric_abs_tolerance=0.01, numeric_rel_tolerance=0.1)
+
+
+def offending(expected, actual, comparison_config=TOLERANT):
+    discrepancy = find_mismatch_of_numbers(expected, actual, "values", comparison_config)
+    return None if discrepancy is None else discrepancy.expected_value
+
+
+def check_numbers():
+    # within the tolerances
+    assert offending([1.0, 100.0], [1.005, 109.0]) is None
+    assert offending([1.0, 100.0], [1.2, 120.0]) == [1.0, 100.0]
+    # equal infinities match, NaN and an infinity against anything else never do
+    assert offending([INF, -INF, 1.0], [INF, -INF, 1.0]) is None
+    assert offending([INF, 1.0, INF], [1.0, INF, -INF]) == [INF, 1.0, INF]
+    assert offending([NAN, 1.0], [NAN, 1.0]) == [NAN]
+    # without tolerances only equal floats match
+    assert offending([0.1], [0.1 + 1e-12], BodyComparisonConfig()) == [0.1]
+
+
+def test_find_mismatch_of_numbers(monkeypatch):
+    monkeypatch.setattr(body, "_numpy", lambda: None)
+    check_numbers()
+
+
+def test_find_mismatch_of_numbers_numpy():
+    pytest.importorskip("numpy")
+    check_numbers()
+
+
+def test_find_mismatch_of_numbers_large_integers():
+    ids = [2**63 - 1, 2**53 + 1]
+
+    assert offending(ids, list(ids)) is None
+    # equal as floats, but not as integers
+    assert offending(ids, [2**63 - 2, 2**53]) == ids
+    assert offending([1, 2.0], [1.0, 2]) is None
+
+
+def test_find_mismatch_of_numbers_unordered():
+    unordered = BodyComparisonConfig(array_order_match=False)
+
+    assert offending([3, 1, 2], [1, 2, 3], unordered) is None
+    assert offending([3, 1, 2], [1, 2, 4], unordered) == [3]
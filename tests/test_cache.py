@@ -0,0 +1,61 @@
+from contractest.common.header import Headers
+from contractest.proxy import cache as cache_module
+from contractest.proxy.cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def key(cache, path, headers=None):
+    return cache.key("default", "get", path, Headers(headers or {}), b"")
+
+
+def test_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = ResponseCache(10, [])
+    cache.put(key(cache, "/a"), 200, {}, b"a", ttl=5)
+
+    clock.now += 4.9
+    assert cache.get(key(cache, "/a")).body == b"a"
+    clock.now += 0.1
+    assert cache.get(key(cache, "/a")) is None
+    # the expired entry is dropped
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = ResponseCache(2, [])
+    assert cache.put(key(cache, "/a"), 200, {}, b"a", ttl=60) == 0
+    cache.put(key(cache, "/b"), 200, {}, b"b", ttl=60)
+    # /a is used, so /b is the least recently used one
+    cache.get(key(cache, "/a"))
+
+    assert cache.put(key(cache, "/c"), 200, {}, b"c", ttl=60) == 1
+    assert cache.get(key(cache, "/b")) is None
+    assert cache.get(key(cache, "/a")).body == b"a"
+    assert cache.get(key(cache, "/c")).body == b"c"
+
+
+def test_key_headers():
+    cache = ResponseCache(10, ["authorization"])
+
+    assert key(cache, "/a", {"authorization": "x"}) != key(
+        cache, "/a", {"authorization": "y"}
+    )
+    assert key(cache, "/a", {"other": "x"}) == key(cache, "/a", {"other": "y"})
+    assert cache.key("default", "get", "/a", Headers({}), b"1") != cache.key(
+        "default", "get", "/a", Headers({}), b"2"
+    )
+
+
+def test_key_by_accept_encoding():
+    # the cached body is encoded by what the client accepts
+    cache = ResponseCache(10, [])
+
+    assert key(cache, "/a", {"accept-encoding": "gzip"}) != key(cache, "/a")
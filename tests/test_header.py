@@ -0,0 +1,60 @@
+from contractest.common.discrepancy import DiscrepancyTypes
+from contractest.common.header import Headers, find_mismatch_of_named_values
+from contractest.config import HeaderComparisonConfig
+
+
+def test_find_mismatch_of_named_values():
+    discrepancies = find_mismatch_of_named_values(
+        {"a": "1", "b": "2", "c": "3"}, {"a": "1", "b": "x", "d": "4"}, "header"
+    )
+
+    assert [(d.path, d.discrepancy_type) for d in discrepancies] == [
+        ("header.b", DiscrepancyTypes.VALUE_MISMATCH),
+        ("header.c", DiscrepancyTypes.KEY_MISMATCH),
+        ("header.d", DiscrepancyTypes.KEY_MISMATCH),
+    ]
+    assert discrepancies[1].msg == "Header c is missing"
+    assert discrepancies[2].msg == "Header d is not expected"
+
+
+def test_find_mismatch_of_named_values_without_value_match():
+    discrepancies = find_mismatch_of_named_values(
+        {"a": "1"}, {"a": "2"}, "cookie", value_match=False
+    )
+
+    assert discrepancies == []
+
+
+def test_compare_with_ignore_rules():
+    config = HeaderComparisonConfig(
+        ignore_headers=["Date"], ignore_cookies=["session", "expires"]
+    )
+    expected = Headers.from_dict(
+        {
+            "Date": "Mon",
+            "Content-Type": "application/json",
+            "Set-Cookie": "session=1; Expires=Mon; Theme=dark",
+        }
+    )
+    actual = Headers.from_dict(
+        {
+            "date": "Tue",
+            "content-type": "application/json",
+            "set-cookie": "session=2; expires=Tue; Theme=dark",
+        }
+    )
+
+    assert actual.compare(expected, config) == []
+
+
+def test_cookie_names_are_case_sensitive():
+    expected = Headers.from_dict({"cookie": "Theme=dark"})
+    actual = Headers.from_dict({"cookie": "theme=dark"})
+
+    discrepancies = actual.compare(expected)
+
+    assert [d.path for d in discrepancies] == ["cookie.Theme", "cookie.theme"]
+    # the normalized view is kept until the headers are modified
+    assert actual.view() is actual.view()
+    actual.set_cookie("theme", "light")
+    assert actual.view().cookies == {"theme": "light"}
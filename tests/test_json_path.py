@@ -0,0 +1,86 @@
+import pytest
+
+from contractest.common.json_path import JsonPath, compile_json_path
+
+DATA = {
+    "data": {
+        "users": [
+            {"id": 1, "roles": ["a", "b"]},
+            {"id": 2, "roles": ["c"]},
+        ],
+        "meta": {"x": 1, "y": 2},
+    },
+    "other": {"kept": True},
+}
+
+
+@pytest.mark.parametrize(
+    "path, value",
+    [
+        ("data.users.0.id", 1),
+        ("data.users[1].id", 2),
+        ("data.users[0].roles[1]", "b"),
+        ("data.meta", {"x": 1, "y": 2}),
+    ],
+)
+def test_get(path, value):
+    assert JsonPath(path).get(DATA) == value
+
+
+@pytest.mark.parametrize(
+    "path, values",
+    [
+        ("data.users.*.id", [1, 2]),
+        ("data.users[*].id", [1, 2]),
+        ("data.users[*].roles[*]", ["a", "b", "c"]),
+        ("data.meta.*", [1, 2]),
+    ],
+)
+def test_get_wildcard(path, values):
+    assert JsonPath(path).get(DATA) == values
+
+
+def test_replace_is_copy_on_write():
+    new = JsonPath("data.users[0].id").replace(DATA, 10)
+
+    assert new["data"]["users"][0]["id"] == 10
+    assert DATA["data"]["users"][0]["id"] == 1
+    # only the containers along the path are copied
+    assert new["other"] is DATA["other"]
+    assert new["data"]["meta"] is DATA["data"]["meta"]
+    assert new["data"]["users"][1] is DATA["data"]["users"][1]
+
+
+def test_replace_wildcard():
+    new = JsonPath("data.users[*].id").replace(DATA, 0)
+
+    assert [u["id"] for u in new["data"]["users"]] == [0, 0]
+    assert [u["id"] for u in DATA["data"]["users"]] == [1, 2]
+    assert new["data"]["users"][0]["roles"] is DATA["data"]["users"][0]["roles"]
+
+    new = JsonPath("data.meta.*").replace(DATA, None)
+    assert new["data"]["meta"] == {"x": None, "y": None}
+    assert DATA["data"]["meta"] == {"x": 1, "y": 2}
+
+
+def test_replace_adds_missing_last_key():
+    new = JsonPath("data.meta.z").replace(DATA, 3)
+
+    assert new["data"]["meta"] == {"x": 1, "y": 2, "z": 3}
+    assert "z" not in DATA["data"]["meta"]
+
+
+def test_compile_json_path_is_cached():
+    assert compile_json_path("a.b") is compile_json_path("a.b")
+
+
+def test_digit_keys_of_objects():
+    data = {"years": {"2020": 5}, "list": [{"0": "a"}]}
+
+    assert JsonPath("years.2020").get(data) == 5
+    assert JsonPath("list.0.0").get(data) == "a"
+    assert JsonPath("years.2020").replace(data, 1) == {
+        "years": {"2020": 1},
+        "list": [{"0": "a"}],
+    }
+    assert JsonPath("list[0].0").replace(data, "b")["list"] == [{"0": "b"}]
@@ -0,0 +1,77 @@
+import pytest
+
+from contractest.common.contract import (
+    ContractFlow,
+    ContractFlowStoreModel,
+    ContractFlowUseValue,
+)
+from contractest.test_service.last_run import (
+    Selection,
+    load_last_run,
+    save_last_run,
+    select_flow,
+)
+from contractest.test_service.result import ContractTestResult
+
+
+def step(contract_hash, store=(), use=()):
+    return ContractFlow(
+        path="/",
+        method="get",
+        store=[ContractFlowStoreModel(key, "body", key) for key in store],
+        use=[ContractFlowUseValue(key, "body", key) for key in use],
+        contract_hash=contract_hash,
+    )
+
+
+def result(contract_hash, passed):
+    return ContractTestResult(
+        contract_hash=contract_hash, method="get", path="/", passed=passed, duration=0
+    )
+
+
+# a -> c is a chain, b and d stand alone
+FLOW = [step("a", store=["id"]), step("b"), step("c", use=["id"]), step("d")]
+LAST_RUN = {
+    "a": result("a", True),
+    "b": result("b", True),
+    "c": result("c", False),
+}
+
+
+def hashes(flow):
+    return [s.contract_hash for s in flow]
+
+
+def test_failed_first_moves_whole_chains():
+    assert hashes(select_flow(FLOW, LAST_RUN, Selection.FAILED_FIRST)) == [
+        "a",
+        "c",
+        "b",
+        "d",
+    ]
+
+
+def test_only_failed_keeps_the_chain_in_flow_order():
+    assert hashes(select_flow(FLOW, LAST_RUN, Selection.ONLY_FAILED)) == ["a", "c"]
+
+
+def test_changed():
+    assert hashes(select_flow(FLOW, LAST_RUN, Selection.CHANGED)) == ["d"]
+
+
+def test_invalid_selection():
+    with pytest.raises(ValueError):
+        select_flow(FLOW, LAST_RUN, "all")
+
+
+def test_save_last_run_drops_removed_contracts(tmp_path):
+    path = str(tmp_path / "cache" / "last_run.json")
+    save_last_run(path, list(LAST_RUN.values()))
+
+    save_last_run(path, [result("d", True)], contract_hashes=["a", "d"])
+
+    assert {h: r.passed for h, r in load_last_run(path).items()} == {
+        "a": True,
+        "d": True,
+    }
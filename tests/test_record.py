@@ -0,0 +1,94 @@
+import gzip
+import zlib
+
+import pytest
+
+from contractest.common.record import ContractRecord, RecordingStore, decode_content
+from contractest.common.store import ContractStore
+
+BODY = b'{"id": 1, "name": "\xc3\xa9"}'
+
+
+def raw_deflate(body):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+@pytest.mark.parametrize(
+    "encoded, content_encoding",
+    [
+        (BODY, ""),
+        (BODY, "identity"),
+        (gzip.compress(BODY), "gzip"),
+        (gzip.compress(BODY), "X-GZIP"),
+        (zlib.compress(BODY), "deflate"),
+        (raw_deflate(BODY), "deflate"),
+        # applied in order, undone in reverse
+        (gzip.compress(zlib.compress(BODY)), "deflate, gzip"),
+    ],
+)
+def test_decode_content(encoded, content_encoding):
+    assert decode_content(encoded, content_encoding) == BODY
+
+
+def test_decode_content_unsupported():
+    with pytest.raises(ValueError):
+        decode_content(BODY, "compress")
+
+
+def test_record_keeps_the_encoded_body():
+    record = ContractRecord(
+        method="get",
+        path="/users/1",
+        status_code=200,
+        request_headers={},
+        request_body=b"",
+        response_headers={
+            "content-type": "application/json",
+            "content-encoding": "gzip",
+        },
+        response_body=gzip.compress(BODY),
+    )
+
+    assert record.response_body == gzip.compress(BODY)
+    # decoded only when turned into a contract
+    assert record.to_contract().response_body.dict == {"id": 1, "name": "é"}
+
+
+def record(n):
+    return ContractRecord(
+        method="post",
+        path=f"/items/{n}",
+        status_code=201,
+        request_headers={"content-type": "application/json"},
+        request_body=b'{"n": %d}' % n,
+        response_headers={"content-type": "application/json"},
+        response_body=b'{"id": %d}' % n,
+        timestamp=float(n),
+    )
+
+
+def test_recording_store_spills_to_disk(tmp_path):
+    store = RecordingStore(memory_limit=200)
+    for n in range(10):
+        store.add(record(n))
+    store.add(record(3))  # a duplicate exchange
+
+    assert store.spilled > 0
+    assert store.memory_size <= 200
+    assert len(store) == 11
+    # the spilled records first, in the recorded order
+    assert [r.path for r in store] == [f"/items/{n}" for n in [*range(10), 3]]
+    assert [r.data for r in store][:10] == [record(n).data for n in range(10)]
+
+    store.write(str(tmp_path))
+    store.close()
+    contracts = ContractStore()
+    contracts.load(str(tmp_path), verbose=False)
+
+    assert len(contracts.contracts) == 10
+    assert [f.timestamp for f in contracts.flow] == [*map(float, range(10)), 3.0]
+    assert contracts.flow[-1].contract_hash == contracts.flow[3].contract_hash
+    assert contracts.get(contracts.flow[3].contract_hash).request_body.dict == {
+        "n": 3
+    }
@@ -0,0 +1,63 @@
+import pytest
+
+from contractest.config import ProxyConfig, RouteConfig
+from contractest.proxy.proxy import APIProxy
+from contractest.proxy.router import DEFAULT_UPSTREAM, Router, _match_prefix
+
+
+@pytest.mark.parametrize(
+    "path, prefix, matches",
+    [
+        ("/users", "/users", True),
+        ("/users/1", "/users", True),
+        ("/users?id=1", "/users", True),
+        ("/users-admin", "/users", False),
+        ("/user", "/users", False),
+        ("/users/1", "/users/", True),
+        ("/anything", "", True),
+    ],
+)
+def test_match_prefix(path, prefix, matches):
+    assert _match_prefix(path, prefix) is matches
+
+
+def test_match():
+    router = Router(
+        ProxyConfig(
+            routes=[
+                RouteConfig("users", "http://users", path_prefix="/users"),
+                RouteConfig("admins", "http://admins", path_prefix="/users/admins"),
+                RouteConfig("api", "http://api", host="api.example.com"),
+            ]
+        )
+    )
+
+    assert router.match(None, "/users/1").name == "users"
+    # the longest prefix wins
+    assert router.match(None, "/users/admins/1").name == "admins"
+    # rules with a host come first, the port is not part of the host
+    assert router.match("API.example.com:8080", "/users/1").name == "api"
+    assert router.match("other.example.com", "/orders").name == DEFAULT_UPSTREAM
+    assert router.match(None, "/users-admin").name == DEFAULT_UPSTREAM
+    router.close()
+
+
+def test_default_route_name_is_reserved():
+    with pytest.raises(ValueError):
+        Router(ProxyConfig(routes=[RouteConfig(DEFAULT_UPSTREAM, "http://other")]))
+
+
+def test_invalid_reload_keeps_the_config(tmp_path):
+    config_file = tmp_path / "conf.toml"
+    config_file.write_text(
+        '[[proxy.routes]]\nname = "default"\nserver_base_url = "http://other"\n'
+    )
+    proxy = APIProxy(config_file=str(config_file))
+    config, router, cache = proxy.config, proxy.router, proxy.cache
+
+    proxy.reload_config()
+
+    assert proxy.config is config
+    assert proxy.router is router
+    assert proxy.cache is cache
+    proxy.router.close()
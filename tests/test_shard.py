@@ -0,0 +1,61 @@
+import argparse
+
+import pytest
+
+from contractest.common.contract import (
+    ContractFlow,
+    ContractFlowStoreModel,
+    ContractFlowUseValue,
+)
+from contractest.test_service.shard import flow_chains, parse_shard, select_shard
+
+
+def step(contract_hash, store=(), use=()):
+    return ContractFlow(
+        path="/",
+        method="get",
+        store=[ContractFlowStoreModel(key, "body", key) for key in store],
+        use=[ContractFlowUseValue(key, "body", key) for key in use],
+        contract_hash=contract_hash,
+    )
+
+
+FLOW = [
+    step("00", store=["token"]),
+    step("01"),
+    step("02", use=["token"], store=["id"]),
+    step("03", store=["other"]),
+    step("04", use=["id"]),
+    step("05", use=["other"]),
+]
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+
+
+@pytest.mark.parametrize("shard", ["3/2", "0/2", "1", "a/b", ""])
+def test_parse_shard_invalid(shard):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(shard)
+
+
+def test_flow_chains():
+    assert flow_chains(FLOW) == [[0, 2, 4], [1], [3, 5]]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5])
+def test_select_shard_partitions_the_flow(count):
+    shards = [select_shard(FLOW, index, count) for index in range(1, count + 1)]
+
+    # every step in exactly one shard, in the order of the flow
+    assert sorted(s.contract_hash for shard in shards for s in shard) == [
+        s.contract_hash for s in FLOW
+    ]
+    for shard in shards:
+        assert shard == [s for s in FLOW if s in shard]
+        # a chain is never split
+        hashes = {s.contract_hash for s in shard}
+        for chain in flow_chains(FLOW):
+            chain_hashes = {FLOW[i].contract_hash for i in chain}
+            assert chain_hashes <= hashes or not chain_hashes & hashes
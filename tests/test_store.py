@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from contractest.common.store import iter_contracts, merge_folders
+
+CONTRACTS = {
+    "a1": {"path": "/users", "body": {"name": "{not} \"a\" [brace]", "ids": [1, 2]}},
+    "b2": {"path": "/é/ü", "body": "text with \\ and \" and }{"},
+    "c3": {"path": "/empty", "body": {}},
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_contracts_split_at_any_chunk_boundary(tmp_path, chunk_size, indent):
+    contracts_file = tmp_path / "contracts.json"
+    contracts_file.write_text(json.dumps(CONTRACTS, indent=indent), encoding="utf-8")
+
+    assert list(iter_contracts(str(contracts_file), chunk_size)) == list(
+        CONTRACTS.items()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1 << 20])
+def test_iter_contracts_empty(tmp_path, chunk_size):
+    contracts_file = tmp_path / "contracts.json"
+    contracts_file.write_text(" { } ")
+
+    assert list(iter_contracts(str(contracts_file), chunk_size)) == []
+
+
+@pytest.mark.parametrize("content", ["[]", '{"a": {"b": 1}', ""])
+def test_iter_contracts_invalid(tmp_path, content):
+    contracts_file = tmp_path / "contracts.json"
+    contracts_file.write_text(content)
+
+    with pytest.raises(ValueError):
+        list(iter_contracts(str(contracts_file), 2))
+
+
+def write_folder(path, contracts, flow):
+    import yaml
+
+    path.mkdir()
+    (path / "contracts.json").write_text(json.dumps(contracts))
+    (path / "flow.yaml").write_text(yaml.dump(flow))
+    return str(path)
+
+
+def flow_entry(contract_hash, timestamp):
+    return {"contract_hash": contract_hash, "timestamp": timestamp}
+
+
+def test_merge_folders(tmp_path):
+    import yaml
+
+    first = write_folder(
+        tmp_path / "0",
+        {"a1": CONTRACTS["a1"], "c3": CONTRACTS["c3"]},
+        [flow_entry("a1", 1.0), flow_entry("c3", 3.0), flow_entry("a1", 3.0)],
+    )
+    second = write_folder(
+        tmp_path / "1",
+        {"b2": CONTRACTS["b2"], "c3": CONTRACTS["c3"]},
+        [flow_entry("c3", 0.5), flow_entry("b2", 3.0)],
+    )
+
+    merge_folders([first, second], str(tmp_path / "merged"))
+
+    merged = tmp_path / "merged"
+    assert json.loads((merged / "contracts.json").read_text()) == {
+        "a1": CONTRACTS["a1"],
+        "c3": CONTRACTS["c3"],
+        "b2": CONTRACTS["b2"],
+    }
+    # by timestamp, then by folder and position
+    assert yaml.safe_load((merged / "flow.yaml").read_text()) == [
+        flow_entry("c3", 0.5),
+        flow_entry("a1", 1.0),
+        flow_entry("c3", 3.0),
+        flow_entry("a1", 3.0),
+        flow_entry("b2", 3.0),
+    ]
@@ -0,0 +1,82 @@
+import pytest
+
+from contractest.common.discrepancy import DiscrepancyTypes
+from contractest.common.xml_compare import compare_xml, iter_xml_events
+from contractest.config import BodyComparisonConfig
+
+DOCUMENT = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<root a="1"><items><item id="1">one</item>between'
+    '<item id="2">two <b>bold</b> after</item></items>'
+    "<name>ünïcode &amp; text</name></root>"
+)
+
+
+def events(document, chunk_size):
+    return [
+        (event, element.tag, element.text if event == "end" else None)
+        for event, element in iter_xml_events(document, chunk_size)
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 13])
+def test_iter_xml_events_split_across_chunks(chunk_size):
+    assert events(DOCUMENT, chunk_size) == events(DOCUMENT, 1 << 20)
+    assert events(DOCUMENT.encode("utf-8"), chunk_size) == events(DOCUMENT, 1 << 20)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_iter_xml_events_tails(chunk_size):
+    tails = [
+        (element.tag, element.tail)
+        for event, element in iter_xml_events(DOCUMENT, chunk_size)
+        if event == "tail"
+    ]
+
+    assert ("item", "between") in tails
+    assert ("b", " after") in tails
+    assert len(tails) == 6  # one per element
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 20])
+def test_compare_xml_equal(chunk_size):
+    assert compare_xml(DOCUMENT, DOCUMENT, "/", BodyComparisonConfig(), chunk_size) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 20])
+@pytest.mark.parametrize(
+    "actual, path, discrepancy_type",
+    [
+        (DOCUMENT.replace(">one<", ">uno<"), "root.items.item", "value"),
+        (DOCUMENT.replace("between", "other"), "root.items.item#tail", "value"),
+        (
+            DOCUMENT.replace("</b> after", "</b> later"),
+            "root.items.item[1].b#tail",
+            "value",
+        ),
+        (DOCUMENT.replace('id="2"', 'id="3"'), "root.items.item[1].@id", "value"),
+        (
+            DOCUMENT.replace("<name>", "<title>").replace("</name>", "</title>"),
+            "root",
+            "key",
+        ),
+    ],
+)
+def test_compare_xml_mismatch(chunk_size, actual, path, discrepancy_type):
+    discrepancies = compare_xml(
+        DOCUMENT, actual, "/", BodyComparisonConfig(), chunk_size
+    )
+
+    assert [d.path for d in discrepancies] == [path]
+    assert discrepancies[0].discrepancy_type == {
+        "value": DiscrepancyTypes.VALUE_MISMATCH,
+        "key": DiscrepancyTypes.KEY_MISMATCH,
+    }[discrepancy_type]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 20])
+def test_compare_xml_ignored_fields(chunk_size):
+    actual = DOCUMENT.replace("<b>bold</b>", "<b>other <i>nested</i></b>")
+    config = BodyComparisonConfig(ignore_fields=["b"])
+
+    assert compare_xml(DOCUMENT, actual, "/", config, chunk_size) == []